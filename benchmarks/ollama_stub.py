@@ -0,0 +1,86 @@
+"""
+A stand-in Ollama server for exercising LocalChat without models or a GPU.
+
+Answers /api/version, /api/tags, /api/ps and a streaming /api/chat that
+emits a fixed reply word by word. Run several on different ports to try
+load balancing across Ollama backends:
+
+    python benchmarks/ollama_stub.py --port 11435 --loaded llama2 &
+    python benchmarks/ollama_stub.py --port 11436 &
+    OLLAMA_BACKENDS=http://localhost:11435,http://localhost:11436 python main.py
+
+Each stub reports how many chats it served, and how many it is serving
+now, at GET /stats.
+
+Usage:
+    python benchmarks/ollama_stub.py [--port 11434] [--models llama2] [--loaded llama2] [--delay 0.05]
+"""
+import argparse
+import asyncio
+import json
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+REPLY = "This is a canned reply from the Ollama stub server."
+
+
+def create_app(models, loaded, delay: float) -> FastAPI:
+    app = FastAPI()
+    counters = {"served": 0, "active": 0}
+
+    @app.get("/api/version")
+    async def version():
+        return {"version": "0.0.0-stub"}
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [{"name": name} for name in models]}
+
+    @app.get("/api/ps")
+    async def ps():
+        return {"models": [{"name": name, "model": name} for name in sorted(loaded)]}
+
+    @app.get("/stats")
+    async def stats():
+        return counters
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        model = body.get("model", models[0])
+        counters["served"] += 1
+        counters["active"] += 1
+        loaded.add(model)
+
+        async def generate():
+            try:
+                for word in REPLY.split(" "):
+                    await asyncio.sleep(delay)
+                    message = {"role": "assistant", "content": word + " "}
+                    yield json.dumps({"model": model, "message": message, "done": False}) + "\n"
+                yield json.dumps({"model": model, "message": {"role": "assistant", "content": ""},
+                                  "done": True}) + "\n"
+            finally:
+                counters["active"] -= 1
+
+        return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--models", default="llama2", help="comma-separated models to list in /api/tags")
+    parser.add_argument("--loaded", default="", help="comma-separated models to report as loaded in /api/ps")
+    parser.add_argument("--delay", type=float, default=0.05, help="seconds between streamed words")
+    args = parser.parse_args()
+
+    models = [name for name in args.models.split(",") if name]
+    loaded = {name for name in args.loaded.split(",") if name}
+    uvicorn.run(create_app(models, loaded, args.delay), host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
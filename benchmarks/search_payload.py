@@ -0,0 +1,99 @@
+"""
+Compare the Chroma query payload RAGService.search used to request with the
+slimmed one it requests now.
+
+The old call asked for the stored embedding of every hit and formatted the
+whole raw result into a debug message. The new call asks only for ids,
+documents, metadatas and distances. Random unit vectors stand in for
+sentence embeddings, so no embedding model is needed, only chromadb.
+
+Usage:
+    python benchmarks/search_payload.py [--documents 2000] [--queries 200]
+"""
+import argparse
+import json
+import random
+import string
+import time
+import numpy as np
+import chromadb
+
+DIMENSIONS = 384  # all-MiniLM-L6-v2
+OLD_INCLUDE = ["metadatas", "documents", "distances", "embeddings"]
+NEW_INCLUDE = ["metadatas", "documents", "distances"]
+
+
+def random_text(length: int) -> str:
+    words = (''.join(random.choices(string.ascii_lowercase, k=random.randint(3, 9)))
+             for _ in range(length // 6))
+    return ' '.join(words)[:length]
+
+
+def random_vectors(count: int) -> np.ndarray:
+    vectors = np.random.default_rng(0).standard_normal((count, DIMENSIONS)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def payload_size(results) -> int:
+    """Size of the result once serialised, the way it would cross a process boundary."""
+    def convert(value):
+        if isinstance(value, np.ndarray):
+            return value.tolist()
+        if isinstance(value, (list, tuple)):
+            return [convert(v) for v in value]
+        if isinstance(value, dict):
+            return {k: convert(v) for k, v in value.items()}
+        return value
+    return len(json.dumps(convert(results)))
+
+
+def run(collection, queries: np.ndarray, include, n_results: int, format_results: bool):
+    latencies = []
+    sizes = []
+    for query in queries:
+        started = time.perf_counter()
+        results = collection.query(query_embeddings=[query.tolist()], n_results=n_results, include=include)
+        if format_results:
+            # What the old f-string debug log did on every call
+            f"Raw search results: {results}"
+        latencies.append(time.perf_counter() - started)
+        sizes.append(payload_size(results))
+    return np.array(latencies) * 1000, np.array(sizes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--n-results", type=int, default=10, help="Chroma results per query (search asks for 2x n_results)")
+    args = parser.parse_args()
+
+    client = chromadb.EphemeralClient()
+    collection = client.create_collection("benchmark", metadata={"hnsw:space": "cosine"})
+    embeddings = random_vectors(args.documents)
+    for start in range(0, args.documents, 500):
+        end = min(start + 500, args.documents)
+        collection.add(
+            ids=[f"doc{i}_chunk_0" for i in range(start, end)],
+            embeddings=embeddings[start:end],
+            documents=[random_text(1000) for _ in range(start, end)],
+            metadatas=[{"parent_id": f"doc{i}", "chunk_index": 0, "filename": f"doc{i}.txt"}
+                       for i in range(start, end)]
+        )
+
+    queries = random_vectors(args.queries + args.documents)[args.documents:]
+    # Warm up the index before timing
+    run(collection, queries[:10], NEW_INCLUDE, args.n_results, False)
+
+    for label, include, format_results in (
+        ("old (embeddings + formatted debug log)", OLD_INCLUDE, True),
+        ("new (no embeddings, lazy logging)", NEW_INCLUDE, False),
+    ):
+        latencies, sizes = run(collection, queries, include, args.n_results, format_results)
+        print(f"{label}:")
+        print(f"  latency ms  p50={np.percentile(latencies, 50):.2f}  p95={np.percentile(latencies, 95):.2f}")
+        print(f"  payload     mean={sizes.mean() / 1024:.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Measure the CPU the chat endpoint spends turning Ollama's NDJSON stream
+into server-sent events, per stream.
+
+The old loop parsed each line with json, built a dict and an f-string
+per token and grew the reply with +=. The new one parses with
+stream_codec (orjson when installed), writes the message event without a
+dict, collects the reply in a list and can coalesce tokens into fewer
+events. Token timings are simulated, so no Ollama server is needed. Each
+event also costs a send through the ASGI server, not counted here, so
+coalescing saves more than these figures show.
+
+Usage:
+    python benchmarks/sse_stream.py [--tokens 2000] [--streams 50] [--tokens-per-second 50]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import stream_codec  # noqa: E402
+from stream_codec import TokenCoalescer  # noqa: E402
+
+WORDS = ["The", " answer", " depends", " on", " the", " configuration", ",", " but", " usually",
+         " you", " can", " restart", " the", " service", " and", " retry", "."]
+
+
+def ollama_lines(count: int):
+    """The NDJSON lines Ollama streams for a reply of count tokens."""
+    lines = []
+    for i in range(count):
+        lines.append(json.dumps({
+            "model": "llama2",
+            "created_at": "2024-01-01T00:00:00.000000Z",
+            "message": {"role": "assistant", "content": WORDS[i % len(WORDS)]},
+            "done": False
+        }))
+    lines.append(json.dumps({"model": "llama2", "message": {"role": "assistant", "content": ""},
+                             "done": True, "eval_count": count}))
+    return lines
+
+
+def old_stream(lines):
+    """The per-token loop as it was."""
+    assistant_message = ""
+    for line in lines:
+        data = json.loads(line)
+        content = data['message'].get('content', '')
+        if content:
+            assistant_message += content
+            yield f"data: {json.dumps({'message': content})}\n\n".encode('utf-8')
+        if data.get('done'):
+            return
+
+
+def new_stream(lines, clock, flush_ms: float, flush_chars: int):
+    """The per-token loop as it is now."""
+    assistant_parts = []
+    coalescer = TokenCoalescer(flush_ms, flush_chars, clock=clock)
+    for line in lines:
+        clock.tick()
+        data = stream_codec.loads(line)
+        content = data['message'].get('content', '')
+        if content:
+            assistant_parts.append(content)
+            event = coalescer.add(content)
+            if event:
+                yield event
+        if data.get('done'):
+            event = coalescer.flush()
+            if event:
+                yield event
+            assistant_message = "".join(assistant_parts)  # noqa: F841
+            return
+
+
+class SimulatedClock:
+    """Advances by one token interval per line, so coalescing sees real token rates."""
+
+    def __init__(self, tokens_per_second: float):
+        self.interval = 1.0 / tokens_per_second
+        self.now = 0.0
+
+    def tick(self):
+        self.now += self.interval
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def measure(name, run, lines, streams):
+    events = size = 0
+    start = time.process_time()
+    for _ in range(streams):
+        for event in run(lines):
+            events += 1
+            size += len(event)
+    cpu = (time.process_time() - start) / streams
+    print(f"{name:<28} {cpu * 1000:8.2f} ms CPU/stream  {events // streams:6d} events  "
+          f"{size // streams:8d} bytes")
+    return cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=2000)
+    parser.add_argument("--streams", type=int, default=50)
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    args = parser.parse_args()
+
+    lines = ollama_lines(args.tokens)
+    print(f"{args.tokens} tokens per stream at {args.tokens_per_second:.0f} tokens/s, "
+          f"{args.streams} streams, orjson: {stream_codec.ORJSON_AVAILABLE}")
+
+    clock = SimulatedClock(args.tokens_per_second)
+    baseline = measure("old (json, per token)", old_stream, lines, args.streams)
+    for label, flush_ms, flush_chars in [
+        ("new (per token)", 0, 0),
+        ("new (50 ms)", 50, 0),
+        ("new (256 chars)", 0, 256),
+        ("new (50 ms / 256 chars)", 50, 256),
+    ]:
+        cpu = measure(label, lambda l: new_stream(l, clock, flush_ms, flush_chars), lines, args.streams)
+        print(f"{'':28} {baseline / cpu:8.2f}x faster")
+
+if __name__ == "__main__":
+    main()
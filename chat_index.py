@@ -0,0 +1,130 @@
+import sqlite3
+import threading
+from datetime import datetime
+from typing import List, Optional
+from models import ChatSummary
+
+# Columns that listings may be sorted by
+SORTABLE_COLUMNS = ("updated_at", "created_at", "title")
+
+# Seconds to wait for another process's write transaction before failing
+BUSY_TIMEOUT = 30.0
+
+class ChatIndex:
+    """SQLite index of chat session metadata, kept in step with the chat files."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=BUSY_TIMEOUT)
+        # WAL lets worker processes read while another writes
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS chats (
+                    id TEXT PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    message_count INTEGER NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chats_updated_at ON chats (updated_at)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chats_created_at ON chats (created_at)")
+
+    def upsert(self, summary: ChatSummary) -> None:
+        """Insert or replace the index entry for a chat."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO chats (id, title, model, created_at, updated_at, message_count) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    summary.id,
+                    summary.title,
+                    summary.model,
+                    summary.created_at.isoformat(),
+                    summary.updated_at.isoformat(),
+                    summary.message_count
+                )
+            )
+
+    def record_message(self, chat_id: str, updated_at: datetime, title: Optional[str] = None) -> Optional[int]:
+        """
+        Count one appended message against a chat, optionally renaming it.
+
+        Returns:
+            The chat's new message count, or None if the chat is not indexed
+        """
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE chats SET message_count = message_count + 1, updated_at = ?, "
+                "title = COALESCE(?, title) WHERE id = ?",
+                (updated_at.isoformat(), title, chat_id)
+            )
+            if cursor.rowcount == 0:
+                return None
+            return self._conn.execute(
+                "SELECT message_count FROM chats WHERE id = ?", (chat_id,)
+            ).fetchone()[0]
+
+    def get(self, chat_id: str) -> Optional[ChatSummary]:
+        """Return the index entry for one chat."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, title, model, created_at, updated_at, message_count FROM chats WHERE id = ?",
+                (chat_id,)
+            ).fetchone()
+        return self._to_summary(row) if row else None
+
+    def delete(self, chat_id: str) -> None:
+        """Remove a chat from the index."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM chats WHERE id = ?", (chat_id,))
+
+    def list(
+        self,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        sort_by: str = "updated_at",
+        descending: bool = True,
+        updated_after: Optional[datetime] = None
+    ) -> List[ChatSummary]:
+        """Return one page of chat summaries in the requested order."""
+        if sort_by not in SORTABLE_COLUMNS:
+            raise ValueError(f"Cannot sort chats by '{sort_by}'. Allowed: {', '.join(SORTABLE_COLUMNS)}")
+        direction = "DESC" if descending else "ASC"
+        where = ""
+        params: list = []
+        if updated_after is not None:
+            where = "WHERE updated_at > ? "
+            params.append(updated_after.isoformat())
+        params.extend([limit if limit is not None else -1, offset])
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, title, model, created_at, updated_at, message_count FROM chats "
+                f"{where}ORDER BY {sort_by} {direction}, id {direction} LIMIT ? OFFSET ?",
+                params
+            ).fetchall()
+        return [self._to_summary(row) for row in rows]
+
+    @staticmethod
+    def _to_summary(row: tuple) -> ChatSummary:
+        return ChatSummary(
+            id=row[0],
+            title=row[1],
+            model=row[2],
+            created_at=datetime.fromisoformat(row[3]),
+            updated_at=datetime.fromisoformat(row[4]),
+            message_count=row[5]
+        )
+
+    def count(self) -> int:
+        """Return the number of indexed chats."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chats").fetchone()[0]
+
+    def clear(self) -> None:
+        """Remove every entry, ahead of a rebuild."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM chats")
@@ -1,78 +1,619 @@
+import asyncio
 import json
 import os
+import tempfile
+from collections import deque
+from dataclasses import dataclass
 from datetime import datetime
 import uuid
-from typing import List, Optional
-from models import ChatSession, Message
+import logging
+import zlib
+from typing import BinaryIO, Iterator, List, Optional, Tuple, Union
+from models import ChatSession, ChatSummary, Message, MessagePage
+from chat_index import ChatIndex
+from file_lock import InterProcessLock
+from lru_cache import LRUCache
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Key that _serialize_message writes last on every log line
+TIMESTAMP_KEY = '"timestamp": "'
+
+# Key that _serialize_message writes first on every log line
+ROLE_KEY = '{"role": "'
+
+# Number of lock stripes shared by all chats; bounds memory regardless of chat count
+LOCK_STRIPES = 64
+
+# Chats whose log scan is kept, so a new turn reads only what was appended
+LOG_SCAN_CACHE_SIZE = 1024
+
+# Bytes read per step when reading a chat log backwards from its end
+TAIL_BLOCK_SIZE = 64 * 1024
+
+# Mode open() gives new files under this process's umask; mkstemp would use 0600
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+DEFAULT_FILE_MODE = 0o666 & ~_UMASK
+
+def atomic_write(path: str, content: str) -> None:
+    """Write a file by renaming a fully written temp file over it, so readers never see a partial write."""
+    directory = os.path.dirname(path) or '.'
+    try:
+        mode = os.stat(path).st_mode & 0o7777
+    except FileNotFoundError:
+        mode = DEFAULT_FILE_MODE
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        # Keep the file's permissions rather than mkstemp's
+        os.chmod(tmp_path, mode)
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+@dataclass(frozen=True)
+class LogScan:
+    """A chat log read up to offset: its message count and the messages a history window may pin."""
+    file: Tuple[int, int]  # (st_dev, st_ino), so a rewritten log is scanned afresh
+    offset: int = 0
+    count: int = 0
+    system: Tuple[Tuple[int, str], ...] = ()  # (position, raw line) of every system message
+    first_user: Optional[Tuple[int, str]] = None
+
+def to_local_naive(value: Optional[datetime]) -> Optional[datetime]:
+    """Convert an aware datetime to naive local time, the form chat timestamps are stored in."""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone().replace(tzinfo=None)
+    return value
 
 class ChatService:
     def __init__(self, storage_dir: str = "data/chats"):
         self.storage_dir = storage_dir
         os.makedirs(storage_dir, exist_ok=True)
+        # Per-chat locks serialising every write to a chat's files, across
+        # threads and across worker processes sharing the storage directory
+        lock_dir = os.path.join(storage_dir, ".locks")
+        os.makedirs(lock_dir, exist_ok=True)
+        self._locks = [
+            InterProcessLock(os.path.join(lock_dir, f"{stripe}.lock"))
+            for stripe in range(LOCK_STRIPES)
+        ]
+        # The same stripes for coroutines, so writers queue on the event loop
+        # instead of each holding a thread blocked on the file lock
+        self._async_locks = [asyncio.Lock() for _ in range(LOCK_STRIPES)]
+        self._log_scans = LRUCache(max_size=LOG_SCAN_CACHE_SIZE)
+        
+        index_path = os.path.join(storage_dir, "index.db")
+        # Held while building the index so only one worker rebuilds it
+        with InterProcessLock(os.path.join(lock_dir, "index.lock")):
+            index_exists = os.path.exists(index_path)
+            self.index = ChatIndex(index_path)
+            if not index_exists:
+                self.rebuild_index()
+
+    @staticmethod
+    def _stripe(chat_id: str) -> int:
+        # crc32 rather than hash(): string hashes differ between processes
+        return zlib.crc32(chat_id.encode('utf-8')) % LOCK_STRIPES
+
+    def _chat_lock(self, chat_id: str) -> InterProcessLock:
+        """Return the lock guarding writes to one chat."""
+        return self._locks[self._stripe(chat_id)]
+
+    async def _run_locked(self, chat_id: str, func, *args, **kwargs):
+        """Run a blocking write to one chat on a worker thread, one coroutine per stripe at a time."""
+        async with self._async_locks[self._stripe(chat_id)]:
+            return await asyncio.to_thread(func, *args, **kwargs)
 
     def _get_chat_path(self, chat_id: str) -> str:
         return os.path.join(self.storage_dir, f"{chat_id}.json")
 
+    def _get_log_path(self, chat_id: str) -> str:
+        return os.path.join(self.storage_dir, f"{chat_id}.jsonl")
+
+    @staticmethod
+    def _serialize_message(message: Message) -> dict:
+        """Convert a message to a JSON-ready dict with an ISO timestamp."""
+        data = message.dict()
+        if not data.get('timestamp'):
+            data['timestamp'] = datetime.now().isoformat()
+        elif isinstance(data['timestamp'], datetime):
+            data['timestamp'] = data['timestamp'].isoformat()
+        return data
+
+    def _read_header(self, chat_id: str) -> Optional[dict]:
+        """Read the session header, which holds everything but the messages."""
+        chat_path = self._get_chat_path(chat_id)
+        if not os.path.exists(chat_path):
+            return None
+        with open(chat_path, 'r') as f:
+            return json.load(f)
+
+    def _write_header(self, chat_id: str, header: dict) -> None:
+        atomic_write(self._get_chat_path(chat_id), json.dumps(header, default=str))
+
+    def _write_log(self, chat_id: str, messages: List[dict]) -> None:
+        atomic_write(
+            self._get_log_path(chat_id),
+            ''.join(json.dumps(msg, default=str) + '\n' for msg in messages)
+        )
+
+    def _append_log(self, chat_id: str, record: dict) -> None:
+        """Append one record to a chat's log and flush it to disk."""
+        line = json.dumps(record, default=str) + '\n'
+        with open(self._get_log_path(chat_id), 'a+b') as f:
+            # Terminate a torn line left by an interrupted append so it
+            # cannot swallow this record
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    line = '\n' + line
+            f.write(line.encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _read_log(self, chat_id: str) -> List[dict]:
+        """Read every message from a chat's append-only log."""
+        log_path = self._get_log_path(chat_id)
+        if not os.path.exists(log_path):
+            return []
+        messages = []
+        with open(log_path, 'r') as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    messages.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A torn final line from an interrupted append
+                    logger.warning(f"Skipping unreadable line {line_number} in {log_path}")
+        return messages
+
     def save_chat(self, chat: ChatSession) -> str:
-        """Save a chat session to disk."""
-        chat_path = self._get_chat_path(chat.id)
-        chat_data = chat.dict()
+        """
+        Save a complete chat session to disk, replacing any stored copy.
+
+        The session header is written to <id>.json and the messages to the
+        <id>.jsonl log. Use append_message to add messages to an existing chat.
+        """
+        header = chat.dict(exclude={'messages'})
         
         # Ensure timestamps are strings
-        chat_data['created_at'] = chat_data['created_at'].isoformat() if isinstance(chat_data['created_at'], datetime) else chat_data['created_at']
-        chat_data['updated_at'] = chat_data['updated_at'].isoformat() if isinstance(chat_data['updated_at'], datetime) else chat_data['updated_at']
-        
-        # Ensure message timestamps are strings
-        for msg in chat_data['messages']:
-            if 'timestamp' not in msg:
-                msg['timestamp'] = datetime.now().isoformat()
-            elif isinstance(msg['timestamp'], datetime):
-                msg['timestamp'] = msg['timestamp'].isoformat()
-        
-        with open(chat_path, 'w') as f:
-            json.dump(chat_data, f, default=str)
+        header['created_at'] = header['created_at'].isoformat() if isinstance(header['created_at'], datetime) else header['created_at']
+        header['updated_at'] = header['updated_at'].isoformat() if isinstance(header['updated_at'], datetime) else header['updated_at']
+        header['message_count'] = len(chat.messages)
+        
+        with self._chat_lock(chat.id):
+            self._write_log(chat.id, [self._serialize_message(msg) for msg in chat.messages])
+            self._write_header(chat.id, header)
+            self.index.upsert(self._summarize(chat))
         return chat.id
 
-    def load_chat(self, chat_id: str) -> Optional[ChatSession]:
-        """Load a chat session from disk."""
-        chat_path = self._get_chat_path(chat_id)
-        if not os.path.exists(chat_path):
-            return None
+    def append_message(self, chat_id: str, message: Message, title: Optional[str] = None) -> bool:
+        """
+        Append one message to a chat without rewriting the conversation.
+
+        The message is appended to the chat's log, so the cost is proportional
+        to the message rather than the conversation. The header file is only
+        rewritten when the title changes and on periodic compaction.
+
+        Returns:
+            False if the chat does not exist
+        """
+        with self._chat_lock(chat_id):
+            return self._append_message(chat_id, message, title)
+
+    def _append_message(self, chat_id: str, message: Message, title: Optional[str]) -> bool:
+        header = self._read_header(chat_id)
+        if header is None:
+            return False
+        if 'messages' in header:
+            # Chat saved before the log format; move its messages into the log first
+            self._compact_chat(chat_id)
+            header = self._read_header(chat_id)
         
-        with open(chat_path, 'r') as f:
-            data = json.load(f)
-            # Convert string timestamps back to datetime
-            data['created_at'] = datetime.fromisoformat(data['created_at'])
-            data['updated_at'] = datetime.fromisoformat(data['updated_at'])
-            
-            # Ensure all messages have timestamps
-            for msg in data['messages']:
-                if 'timestamp' not in msg:
-                    msg['timestamp'] = datetime.now().isoformat()
-                elif isinstance(msg['timestamp'], datetime):
-                    msg['timestamp'] = msg['timestamp'].isoformat()
-            
-            return ChatSession(**data)
-
-    def list_chats(self) -> List[ChatSession]:
-        """List all saved chat sessions."""
-        chats = []
+        record = self._serialize_message(message)
+        self._append_log(chat_id, record)
+        
+        updated_at = datetime.fromisoformat(record['timestamp'])
+        if title and title != header.get('title'):
+            header['title'] = title
+            header['updated_at'] = updated_at.isoformat()
+            self._write_header(chat_id, header)
+        else:
+            title = None
+        
+        message_count = self.index.record_message(chat_id, updated_at, title)
+        if message_count is None:
+            # Chat missing from the index; index it from the files
+            chat = self.load_chat(chat_id)
+            self.index.upsert(self._summarize(chat))
+        elif message_count % get_settings().chat_compaction_interval == 0:
+            self._compact_chat(chat_id)
+        return True
+
+    def compact_chat(self, chat_id: str) -> None:
+        """
+        Bring a chat's header file up to date with its log.
+
+        Folds messages stored inline by older versions into the log and
+        refreshes updated_at and message_count in the header so it can be
+        read on its own, e.g. when rebuilding the index.
+        """
+        with self._chat_lock(chat_id):
+            self._compact_chat(chat_id)
+
+    def _compact_chat(self, chat_id: str) -> None:
+        header = self._read_header(chat_id)
+        if header is None:
+            return
+        
+        if 'messages' in header:
+            inline_messages = [
+                {**msg, 'timestamp': msg.get('timestamp') or header['updated_at']}
+                for msg in header.pop('messages')
+            ]
+            messages = inline_messages + self._read_log(chat_id)
+            self._write_log(chat_id, messages)
+            header['message_count'] = len(messages)
+        else:
+            summary = self.index.get(chat_id)
+            if summary:
+                header['updated_at'] = summary.updated_at.isoformat()
+                header['message_count'] = summary.message_count
+        
+        self._write_header(chat_id, header)
+        logger.debug(f"Compacted chat {chat_id}")
+
+    @staticmethod
+    def _summarize(chat: ChatSession) -> ChatSummary:
+        """Build the index entry for a chat session."""
+        return ChatSummary(
+            id=chat.id,
+            title=chat.title,
+            model=chat.model,
+            created_at=chat.created_at,
+            updated_at=chat.updated_at,
+            message_count=len(chat.messages)
+        )
+
+    def rebuild_index(self) -> None:
+        """Rebuild the chat index by scanning every chat file on disk."""
+        self.index.clear()
+        count = 0
         for filename in os.listdir(self.storage_dir):
             if filename.endswith('.json'):
                 chat_id = filename[:-5]  # Remove .json extension
-                chat = self.load_chat(chat_id)
+                try:
+                    chat = self.load_chat(chat_id)
+                except Exception as e:
+                    logger.error(f"Skipping unreadable chat file {filename}: {str(e)}")
+                    continue
                 if chat:
-                    chats.append(chat)
-        return sorted(chats, key=lambda x: x.updated_at, reverse=True)
+                    self.index.upsert(self._summarize(chat))
+                    count += 1
+        logger.info(f"Rebuilt chat index with {count} chats")
+
+    def load_chat(self, chat_id: str) -> Optional[ChatSession]:
+        """Load a chat session from its header and message log."""
+        data = self._read_header(chat_id)
+        if data is None:
+            return None
+        
+        # Messages stored inline by older versions come before the log
+        messages = data.pop('messages', []) + self._read_log(chat_id)
+        
+        # Convert string timestamps back to datetime
+        data['created_at'] = datetime.fromisoformat(data['created_at'])
+        data['updated_at'] = datetime.fromisoformat(data['updated_at'])
+        
+        # Ensure all messages have timestamps
+        for msg in messages:
+            if not msg.get('timestamp'):
+                msg['timestamp'] = data['updated_at']
+        
+        # The header's updated_at is only refreshed on compaction
+        if messages:
+            last_timestamp = messages[-1]['timestamp']
+            if isinstance(last_timestamp, str):
+                last_timestamp = datetime.fromisoformat(last_timestamp)
+            data['updated_at'] = max(data['updated_at'], last_timestamp)
+        
+        return ChatSession(**data, messages=messages)
+
+    def _iter_raw_messages(self, chat_id: str, inline_messages: List[dict]) -> Iterator[Union[dict, str]]:
+        """Yield stored messages without decoding log lines: dicts for inline messages, raw lines for the log."""
+        yield from inline_messages
+        log_path = self._get_log_path(chat_id)
+        if not os.path.exists(log_path):
+            return
+        with open(log_path, 'r') as f:
+            for line in f:
+                # Skip blank lines and torn records, as _read_log does
+                if line.rstrip().endswith('}'):
+                    yield line
+
+    def _scan_log(self, chat_id: str, f: BinaryIO) -> LogScan:
+        """
+        Count the messages in an open chat log and find its pinnable ones.
+
+        Continues from the last scan of the same file, so only lines appended
+        since are read. Stops before a line that is still being appended.
+        """
+        stat = os.fstat(f.fileno())
+        file = (stat.st_dev, stat.st_ino)
+        scan = self._log_scans.get(chat_id)
+        if scan is None or scan.file != file or scan.offset > stat.st_size:
+            scan = LogScan(file)
+        if scan.offset == stat.st_size:
+            return scan
+        
+        offset, count, system, first_user = scan.offset, scan.count, list(scan.system), scan.first_user
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            offset += len(line)
+            raw = line.decode('utf-8')
+            # Skip blank lines and torn records, as _read_log does
+            if not raw.rstrip().endswith('}'):
+                continue
+            role = self._raw_role(raw)
+            if role == 'system':
+                system.append((count, raw))
+            elif role == 'user' and first_user is None:
+                first_user = (count, raw)
+            count += 1
+        scan = LogScan(file, offset, count, tuple(system), first_user)
+        self._log_scans.put(chat_id, scan)
+        return scan
+
+    @staticmethod
+    def _tail_lines(f: BinaryIO, end: int, count: int, skip: int = 0) -> List[str]:
+        """Return up to count raw log lines, oldest first, ending skip lines before byte offset end."""
+        lines: List[str] = []
+        position = end
+        remainder = b''
+        while position > 0 and len(lines) < skip + count:
+            size = min(TAIL_BLOCK_SIZE, position)
+            position -= size
+            f.seek(position)
+            block = f.read(size) + remainder
+            parts = block.split(b'\n')
+            # The first part may continue in the previous block
+            remainder = parts.pop(0) if position > 0 else b''
+            for part in reversed(parts):
+                raw = part.decode('utf-8')
+                if raw.rstrip().endswith('}'):
+                    lines.append(raw)
+        lines = lines[skip:skip + count]
+        lines.reverse()
+        return lines
+
+    @staticmethod
+    def _raw_timestamp(raw: Union[dict, str]) -> Optional[datetime]:
+        """Extract a message's timestamp, reading only the tail of a raw log line."""
+        if isinstance(raw, dict):
+            value = raw.get('timestamp')
+        else:
+            position = raw.rfind(TIMESTAMP_KEY)
+            if position == -1:
+                return None
+            start = position + len(TIMESTAMP_KEY)
+            value = raw[start:raw.index('"', start)]
+        if not value:
+            return None
+        return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+
+    def get_messages(
+        self,
+        chat_id: str,
+        limit: Optional[int] = None,
+        before: Optional[int] = None,
+        after: Optional[int] = None,
+        since: Optional[datetime] = None
+    ) -> Optional[MessagePage]:
+        """
+        Return one page of a chat's messages without loading the whole conversation.
+
+        Messages are addressed by their position in the chat. Only the lines
+        inside the requested page are decoded; the rest of the log is skipped.
+        A page of the latest messages is read backwards from the end of the
+        log, using the message count kept between calls, so its cost does not
+        grow with the conversation.
+
+        Args:
+            chat_id: The chat to read
+            limit: Maximum number of messages to return
+            before: Only messages at positions lower than this
+            after: Only messages at positions higher than this
+            since: Only messages with a timestamp later than this
+
+        Returns:
+            The page, or None if the chat does not exist. With only limit (or
+            before) set, the page holds the latest matching messages; with
+            after or since it holds the earliest ones after the cursor.
+        """
+        header = self._read_header(chat_id)
+        if header is None:
+            return None
+        since = to_local_naive(since)
+        
+        from_end = limit is not None and after is None and since is None
+        log_path = self._get_log_path(chat_id)
+        if from_end and 'messages' not in header and os.path.exists(log_path):
+            with open(log_path, 'rb') as f:
+                scan = self._scan_log(chat_id, f)
+                end = max(0, min(before, scan.count)) if before is not None else scan.count
+                lines = self._tail_lines(f, scan.offset, max(0, limit), skip=scan.count - end)
+            return MessagePage(
+                messages=[Message(**json.loads(raw)) for raw in lines],
+                start_index=end - len(lines) if lines else 0,
+                total=scan.count,
+                has_more=end > len(lines)
+            )
+        
+        window = deque(maxlen=limit) if from_end else []
+        matched = 0
+        total = 0
+        for index, raw in enumerate(self._iter_raw_messages(chat_id, header.get('messages', []))):
+            total += 1
+            if after is not None and index <= after:
+                continue
+            if before is not None and index >= before:
+                continue
+            if since is not None:
+                timestamp = self._raw_timestamp(raw)
+                if timestamp is None or timestamp <= since:
+                    continue
+            matched += 1
+            if from_end or limit is None or len(window) < limit:
+                window.append((index, raw))
+        
+        messages = [
+            Message(**(raw if isinstance(raw, dict) else json.loads(raw)))
+            for _, raw in window
+        ]
+        return MessagePage(
+            messages=messages,
+            start_index=window[0][0] if window else (after + 1 if after is not None else 0),
+            total=total,
+            has_more=matched > len(window)
+        )
+
+    @staticmethod
+    def _raw_role(raw: Union[dict, str]) -> Optional[str]:
+        """Extract a message's role, reading only the head of a raw log line."""
+        if isinstance(raw, dict):
+            return raw.get('role')
+        if raw.startswith(ROLE_KEY):
+            return raw[len(ROLE_KEY):raw.index('"', len(ROLE_KEY))]
+        return json.loads(raw).get('role')
+
+    def get_history_window(
+        self,
+        chat_id: str,
+        limit: int,
+        pin_system: bool = True,
+        pin_first_user: bool = False
+    ) -> Optional[List[Message]]:
+        """
+        Return the latest messages of a chat plus pinned earlier ones, oldest first.
+
+        The window is read backwards from the end of the log, and the log's
+        message count and pinned messages are kept between calls, so each turn
+        reads only the window and the lines appended since the last one.
+
+        Args:
+            chat_id: The chat to read
+            limit: Number of latest messages to return
+            pin_system: Also return system messages from before the window
+            pin_first_user: Also return the first user message if it is before the window
+
+        Returns:
+            The messages, or None if the chat does not exist
+        """
+        header = self._read_header(chat_id)
+        if header is None:
+            return None
+        log_path = self._get_log_path(chat_id)
+        if 'messages' not in header and os.path.exists(log_path):
+            with open(log_path, 'rb') as f:
+                scan = self._scan_log(chat_id, f)
+                window = self._tail_lines(f, scan.offset, max(0, limit))
+            window_start = scan.count - len(window)
+            pinned = [item for item in scan.system if pin_system and item[0] < window_start]
+            if pin_first_user and scan.first_user and scan.first_user[0] < window_start:
+                pinned = sorted(pinned + [scan.first_user])
+            return [Message(**json.loads(raw)) for raw in [raw for _, raw in pinned] + window]
+        
+        # Messages stored inline by older versions: read the whole chat
+        window = deque(maxlen=max(0, limit))
+        pinned = []
+        first_user_seen = False
+        for index, raw in enumerate(self._iter_raw_messages(chat_id, header.get('messages', []))):
+            window.append((index, raw))
+            role = self._raw_role(raw)
+            if (pin_system and role == 'system') or (pin_first_user and role == 'user' and not first_user_seen):
+                pinned.append((index, raw))
+            first_user_seen = first_user_seen or role == 'user'
+        
+        window_start = window[0][0] if window else float('inf')
+        selected = [item for item in pinned if item[0] < window_start] + list(window)
+        return [
+            Message(**(raw if isinstance(raw, dict) else json.loads(raw)))
+            for _, raw in selected
+        ]
+
+    def get_chat_summary(self, chat_id: str) -> Optional[ChatSummary]:
+        """Return a chat's metadata from the index without reading its messages."""
+        return self.index.get(chat_id)
+
+    def list_chats(
+        self,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        sort_by: str = "updated_at",
+        descending: bool = True,
+        updated_after: Optional[datetime] = None
+    ) -> List[ChatSummary]:
+        """List saved chat sessions from the index, most recently updated first by default."""
+        return self.index.list(
+            limit=limit,
+            offset=offset,
+            sort_by=sort_by,
+            descending=descending,
+            updated_after=to_local_naive(updated_after)
+        )
+
+    def count_chats(self) -> int:
+        """Return the number of saved chat sessions."""
+        return self.index.count()
 
     def delete_chat(self, chat_id: str) -> bool:
         """Delete a chat session."""
         chat_path = self._get_chat_path(chat_id)
-        if os.path.exists(chat_path):
-            os.remove(chat_path)
-            return True
+        with self._chat_lock(chat_id):
+            if os.path.exists(chat_path):
+                os.remove(chat_path)
+                log_path = self._get_log_path(chat_id)
+                if os.path.exists(log_path):
+                    os.remove(log_path)
+                self.index.delete(chat_id)
+                return True
         return False
 
+    async def asave_chat(self, chat: ChatSession) -> str:
+        """Async variant of save_chat; the file lock and fsync run off the event loop."""
+        return await self._run_locked(chat.id, self.save_chat, chat)
+
+    async def aappend_message(self, chat_id: str, message: Message, title: Optional[str] = None) -> bool:
+        """Async variant of append_message; the file lock and fsync run off the event loop."""
+        return await self._run_locked(chat_id, self.append_message, chat_id, message, title=title)
+
+    async def adelete_chat(self, chat_id: str) -> bool:
+        """Async variant of delete_chat; the file lock runs off the event loop."""
+        return await self._run_locked(chat_id, self.delete_chat, chat_id)
+
+    async def aload_chat(self, chat_id: str) -> Optional[ChatSession]:
+        """Async variant of load_chat; the files are read off the event loop."""
+        return await asyncio.to_thread(self.load_chat, chat_id)
+
+    async def aget_messages(self, chat_id: str, **kwargs) -> Optional[MessagePage]:
+        """Async variant of get_messages; the log is read off the event loop."""
+        return await asyncio.to_thread(self.get_messages, chat_id, **kwargs)
+
+    async def aget_history_window(self, chat_id: str, limit: int, **kwargs) -> Optional[List[Message]]:
+        """Async variant of get_history_window; the log is read off the event loop."""
+        return await asyncio.to_thread(self.get_history_window, chat_id, limit, **kwargs)
+
     def generate_chat_title(self, messages: List[Message]) -> str:
         """Generate a title for the chat based on the first few messages."""
         if not messages:
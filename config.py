@@ -1,5 +1,50 @@
+import os
+import threading
+import time
+from typing import Optional
+
 from models.settings import Settings
 
-def get_settings():
-    """Get application settings."""
-    return Settings.load() 
\ No newline at end of file
+# Seconds between checks of .env for changes written by another worker
+SETTINGS_CHECK_INTERVAL = 1.0
+
+# Process-wide settings snapshot; replaced as a whole on invalidation so
+# readers never see a half-updated object
+_settings: Optional[Settings] = None
+_settings_mtime: Optional[int] = None
+_settings_checked_at = 0.0
+_settings_lock = threading.Lock()
+
+def _env_mtime() -> Optional[int]:
+    try:
+        return os.stat(".env").st_mtime_ns
+    except OSError:
+        return None
+
+def get_settings() -> Settings:
+    """
+    Get application settings, reading .env only on first use and when it changes.
+
+    .env is checked at most every SETTINGS_CHECK_INTERVAL seconds, so a
+    change saved by one worker process reaches the others within that time.
+    """
+    global _settings, _settings_mtime, _settings_checked_at
+    now = time.monotonic()
+    if _settings is None or now - _settings_checked_at >= SETTINGS_CHECK_INTERVAL:
+        with _settings_lock:
+            if _settings is None or now - _settings_checked_at >= SETTINGS_CHECK_INTERVAL:
+                mtime = _env_mtime()
+                if _settings is None or mtime != _settings_mtime:
+                    _settings = Settings.load()
+                    _settings_mtime = mtime
+                _settings_checked_at = now
+    return _settings
+
+def invalidate_settings() -> Settings:
+    """Reload settings from .env after they change and return the new snapshot."""
+    global _settings, _settings_mtime, _settings_checked_at
+    with _settings_lock:
+        _settings_mtime = _env_mtime()
+        _settings = Settings.load()
+        _settings_checked_at = time.monotonic()
+    return _settings
@@ -0,0 +1,82 @@
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import Optional
+import numpy as np
+from lru_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Separates model id and text in persisted keys; never produced by normalize()
+_KEY_SEPARATOR = "\x1f"
+
+
+class EmbeddingCache(LRUCache):
+    """
+    LRU cache of embeddings keyed by model id and normalized text.
+
+    Optionally persisted to a .npz file so the cache survives restarts.
+    """
+
+    def __init__(self, max_size: int = 1024, path: Optional[str] = None):
+        super().__init__(max_size)
+        self.path = Path(path) if path else None
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """
+        Collapse runs of whitespace and trim the text.
+
+        Case is kept: whether "Foo" and "foo" embed the same depends on the model.
+        """
+        return " ".join(text.split())
+
+    def get_embedding(self, model_id: str, text: str) -> Optional[np.ndarray]:
+        """Return the cached embedding for text, or None on a miss."""
+        return self.get((model_id, self.normalize(text)))
+
+    def put_embedding(self, model_id: str, text: str, embedding: np.ndarray) -> None:
+        """Store the embedding for text."""
+        embedding = np.asarray(embedding, dtype=np.float32)
+        embedding.setflags(write=False)  # Shared between callers
+        self.put((model_id, self.normalize(text)), embedding)
+
+    def load(self) -> None:
+        """Load persisted entries, if a path is configured and the file exists."""
+        if not self.path or not self.path.exists():
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                keys = data["keys"]
+                entries = [
+                    (tuple(str(key).split(_KEY_SEPARATOR, 1)), data[f"e{i}"])
+                    for i, key in enumerate(keys)
+                ]
+        except Exception as e:
+            logger.warning(f"Could not load embedding cache from {self.path}: {str(e)}")
+            return
+
+        for (model_id, text), embedding in entries[-self.max_size:] if self.max_size else []:
+            self.put_embedding(model_id, text, embedding)
+        logger.info(f"Loaded {len(self)} cached embeddings from {self.path}")
+
+    def save(self) -> None:
+        """Persist entries in LRU order, if a path is configured."""
+        if not self.path:
+            return
+        entries = self.items()
+        arrays = {f"e{i}": embedding for i, (_, embedding) in enumerate(entries)}
+        keys = np.array([f"{model_id}{_KEY_SEPARATOR}{text}" for (model_id, text), _ in entries], dtype=str)
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=f".{self.path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, keys=keys, **arrays)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        logger.info(f"Saved {len(entries)} cached embeddings to {self.path}")
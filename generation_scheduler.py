@@ -0,0 +1,201 @@
+import asyncio
+import bisect
+import itertools
+import logging
+import time
+from typing import AsyncIterator, Callable, Dict, List, Optional
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when a generation cannot be queued because the model's queue is full."""
+
+
+class QueueTimeoutError(Exception):
+    """Raised when a queued generation is not admitted before its deadline."""
+
+
+class GenerationTicket:
+    """One generation's place in a model's queue, and later its in-flight slot."""
+
+    def __init__(self, scheduler: "GenerationScheduler", model: str, priority: int, deadline: float, sequence: int):
+        self.scheduler = scheduler
+        self.model = model
+        self.priority = priority
+        self.deadline = deadline
+        self.admitted = False
+        self.released = False
+        self.enqueued_at = time.monotonic()
+        # Higher priority first, then first come first served
+        self.sort_key = (-priority, sequence)
+        self._changed = asyncio.Event()
+
+    def __lt__(self, other: "GenerationTicket") -> bool:
+        return self.sort_key < other.sort_key
+
+    def _notify(self) -> None:
+        self._changed.set()
+
+    async def wait(self) -> AsyncIterator[int]:
+        """
+        Wait for admission, yielding the 1-based queue position whenever it changes.
+
+        Yields nothing if a slot is free straight away.
+
+        Raises:
+            QueueTimeoutError: If the deadline passes first; the ticket leaves the queue
+        """
+        last_position = None
+        while not self.admitted:
+            position = self.scheduler.position(self)
+            if position != last_position:
+                last_position = position
+                yield position
+            remaining = self.deadline - time.monotonic()
+            if remaining <= 0:
+                self.release()
+                raise QueueTimeoutError(
+                    f"Timed out after {time.monotonic() - self.enqueued_at:.0f}s waiting for "
+                    f"a free slot on model {self.model}"
+                )
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    def release(self, cancelled: bool = False) -> None:
+        """
+        Leave the queue or give back the in-flight slot; safe to call more than once.
+
+        Pass cancelled=True when the client went away before the generation finished.
+        """
+        if not self.released:
+            self.released = True
+            if cancelled:
+                self.scheduler.cancelled += 1
+            self.scheduler._release(self)
+
+
+class _ModelQueue:
+    def __init__(self):
+        self.in_flight = 0
+        self.waiting: List[GenerationTicket] = []
+
+
+class GenerationScheduler:
+    """
+    Admission control for generations, per model.
+
+    At most max_in_flight generations run against a model at once; further
+    requests wait in a bounded queue ordered by priority, then arrival, and
+    give up at their deadline. Requests beyond the queue size are rejected
+    straight away so callers can back off instead of piling onto Ollama.
+    Limits apply per process.
+
+    slots_per_model returns max_in_flight; by default it is the
+    ollama_max_in_flight setting.
+    """
+
+    def __init__(self, slots_per_model: Optional[Callable[[], int]] = None):
+        self._slots_per_model = slots_per_model or (lambda: get_settings().ollama_max_in_flight)
+        self._models: Dict[str, _ModelQueue] = {}
+        self._sequence = itertools.count()
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.cancelled = 0
+
+    def enqueue(self, model: str, priority: int = 0, timeout: Optional[float] = None) -> GenerationTicket:
+        """
+        Claim a slot for a generation, or a place in the queue for one.
+
+        Args:
+            model: Model the generation will run on
+            priority: Higher values are admitted first
+            timeout: Seconds to wait for admission (default: settings.ollama_queue_timeout)
+
+        Raises:
+            QueueFullError: If the model's queue is full
+        """
+        settings = get_settings()
+        self.check_capacity(model)
+        queue = self._models[model]
+
+        timeout = settings.ollama_queue_timeout if timeout is None else timeout
+        ticket = GenerationTicket(self, model, priority, time.monotonic() + timeout, next(self._sequence))
+        bisect.insort(queue.waiting, ticket)
+        self._admit(queue)
+        if not ticket.admitted:
+            logger.debug("Queued generation for %s at position %d (priority %d)",
+                         model, self.position(ticket), priority)
+        return ticket
+
+    def check_capacity(self, model: str) -> None:
+        """
+        Check that a generation for model could be queued, without claiming anything.
+
+        Lets callers reject a request before doing work for it.
+
+        Raises:
+            QueueFullError: If the model's queue is full
+        """
+        queue = self._models.setdefault(model, _ModelQueue())
+        if queue.in_flight >= self._slots_per_model() and len(queue.waiting) >= get_settings().ollama_queue_size:
+            self.rejected += 1
+            raise QueueFullError(
+                f"Model {model} is at capacity: {queue.in_flight} generations running "
+                f"and {len(queue.waiting)} waiting"
+            )
+
+    def position(self, ticket: GenerationTicket) -> int:
+        """1-based position of a waiting ticket in its model's queue, or 0 once admitted."""
+        if ticket.admitted:
+            return 0
+        waiting = self._models[ticket.model].waiting
+        return bisect.bisect_left(waiting, ticket) + 1
+
+    def _admit(self, queue: _ModelQueue) -> None:
+        """Move tickets from the head of the queue into free slots."""
+        max_in_flight = self._slots_per_model()
+        admitted = False
+        while queue.waiting and queue.in_flight < max_in_flight:
+            ticket = queue.waiting.pop(0)
+            ticket.admitted = True
+            queue.in_flight += 1
+            self.admitted += 1
+            ticket._notify()
+            admitted = True
+        if admitted:
+            # Everyone behind moved up
+            for ticket in queue.waiting:
+                ticket._notify()
+
+    def _release(self, ticket: GenerationTicket) -> None:
+        queue = self._models[ticket.model]
+        if ticket.admitted:
+            queue.in_flight -= 1
+        else:
+            index = bisect.bisect_left(queue.waiting, ticket)
+            if index < len(queue.waiting) and queue.waiting[index] is ticket:
+                queue.waiting.pop(index)
+                if time.monotonic() >= ticket.deadline:
+                    self.timed_out += 1
+                for other in queue.waiting[index:]:
+                    other._notify()
+        self._admit(queue)
+
+    def stats(self) -> Dict[str, object]:
+        """Return admission counters and per-model queue depth."""
+        return {
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "cancelled": self.cancelled,
+            "models": {
+                model: {"in_flight": queue.in_flight, "waiting": len(queue.waiting)}
+                for model, queue in self._models.items()
+            }
+        }
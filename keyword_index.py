@@ -0,0 +1,161 @@
+import re
+import sqlite3
+import threading
+from typing import Iterable, List, Tuple
+
+# Terms that match nearly every chunk and would only add noise to BM25
+STOPWORDS = frozenset("""
+    a about above after again all also am an and any are as at be because been
+    before being below between both but by can could did do does doing down
+    during each few for from further had has have having he her here hers him
+    his how i if in into is it its itself just me more most my no nor not now
+    of off on once only or other our ours out over own same she should so some
+    such than that the their theirs them then there these they this those
+    through to too under until up very was we were what when where which while
+    who whom why will with would you your yours
+""".split())
+
+# Words as FTS5 tokenizes them: hyphens and underscores are part of a token,
+# so error codes like E-1042 and identifiers like max_tokens match whole
+_TERM = re.compile(r"[\w][\w\-]*")
+
+# Seconds to wait for another process's write transaction before failing
+BUSY_TIMEOUT = 30.0
+
+class KeywordIndex:
+    """
+    SQLite FTS5 index of chunk text, ranked with BM25.
+
+    Kept in step with the Chroma collection: chunks are added and removed
+    alongside it, so the index never needs a full rebuild after setup. Also
+    holds the corpus generation and the number of documents, so every worker
+    process sees a change made by any of them.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=BUSY_TIMEOUT)
+        # WAL lets worker processes read while another writes
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS chunks (
+                    rowid INTEGER PRIMARY KEY,
+                    chunk_id TEXT NOT NULL UNIQUE,
+                    parent_id TEXT NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_parent_id ON chunks (parent_id)")
+            self._conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS chunk_text USING fts5(
+                    content,
+                    tokenize = "unicode61 tokenchars '-_'"
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS corpus (
+                    id INTEGER PRIMARY KEY CHECK (id = 0),
+                    generation INTEGER NOT NULL,
+                    documents INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            self._conn.execute("INSERT OR IGNORE INTO corpus (id, generation) VALUES (0, 0)")
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(corpus)")]
+            if 'documents' not in columns:
+                # Index created before documents were counted
+                self._conn.execute("ALTER TABLE corpus ADD COLUMN documents INTEGER NOT NULL DEFAULT 0")
+                self._conn.execute(
+                    "UPDATE corpus SET documents = (SELECT COUNT(DISTINCT parent_id) FROM chunks) WHERE id = 0"
+                )
+
+    def add(self, chunks: Iterable[Tuple[str, str, str]]) -> None:
+        """Index (chunk_id, parent_id, text) tuples, replacing chunks already indexed."""
+        with self._lock, self._conn:
+            new_parents = set()
+            for chunk_id, parent_id, text in chunks:
+                if parent_id not in new_parents and not self._conn.execute(
+                    "SELECT 1 FROM chunks WHERE parent_id = ? LIMIT 1", (parent_id,)
+                ).fetchone():
+                    new_parents.add(parent_id)
+                row = self._conn.execute("SELECT rowid FROM chunks WHERE chunk_id = ?", (chunk_id,)).fetchone()
+                if row:
+                    self._conn.execute("DELETE FROM chunk_text WHERE rowid = ?", (row[0],))
+                    self._conn.execute("DELETE FROM chunks WHERE rowid = ?", (row[0],))
+                rowid = self._conn.execute(
+                    "INSERT INTO chunks (chunk_id, parent_id) VALUES (?, ?)", (chunk_id, parent_id)
+                ).lastrowid
+                self._conn.execute("INSERT INTO chunk_text (rowid, content) VALUES (?, ?)", (rowid, text))
+            if new_parents:
+                self._conn.execute("UPDATE corpus SET documents = documents + ? WHERE id = 0", (len(new_parents),))
+
+    def delete_parent(self, parent_id: str) -> None:
+        """Remove every chunk of a document."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM chunk_text WHERE rowid IN (SELECT rowid FROM chunks WHERE parent_id = ?)",
+                (parent_id,)
+            )
+            if self._conn.execute("DELETE FROM chunks WHERE parent_id = ?", (parent_id,)).rowcount:
+                self._conn.execute("UPDATE corpus SET documents = documents - 1 WHERE id = 0")
+
+    @staticmethod
+    def query_terms(text: str) -> List[str]:
+        """Distinct lower-cased query terms, without stopwords, in order of appearance."""
+        terms = []
+        for term in _TERM.findall(text.lower()):
+            term = term.strip('-')
+            if term and term not in STOPWORDS and term not in terms:
+                terms.append(term)
+        return terms
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[str, float]]:
+        """
+        Return up to limit (chunk_id, bm25 score) pairs, best match first.
+
+        Any query term may match; BM25 weighs rare terms such as product
+        names and error codes above common ones. Scores are positive, higher
+        is better.
+        """
+        terms = self.query_terms(query)
+        if not terms:
+            return []
+        # Quote every term so user text can never be read as FTS5 syntax
+        match = " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunks.chunk_id, bm25(chunk_text) AS score FROM chunk_text "
+                "JOIN chunks ON chunks.rowid = chunk_text.rowid "
+                "WHERE chunk_text MATCH ? ORDER BY score LIMIT ?",
+                (match, limit)
+            ).fetchall()
+        # FTS5 reports BM25 as a negative number, lower meaning better
+        return [(chunk_id, -score) for chunk_id, score in rows]
+
+    def generation(self) -> int:
+        """Return the corpus generation."""
+        with self._lock:
+            return self._conn.execute("SELECT generation FROM corpus WHERE id = 0").fetchone()[0]
+
+    def bump_generation(self) -> int:
+        """Record a change to the corpus and return the new generation."""
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE corpus SET generation = generation + 1 WHERE id = 0")
+            return self._conn.execute("SELECT generation FROM corpus WHERE id = 0").fetchone()[0]
+
+    def document_count(self) -> int:
+        """Return the number of documents with indexed chunks, without scanning them."""
+        with self._lock:
+            return self._conn.execute("SELECT documents FROM corpus WHERE id = 0").fetchone()[0]
+
+    def count(self) -> int:
+        """Return the number of indexed chunks."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def clear(self) -> None:
+        """Remove every entry, ahead of a rebuild."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM chunk_text")
+            self._conn.execute("DELETE FROM chunks")
+            self._conn.execute("UPDATE corpus SET documents = 0 WHERE id = 0")
@@ -5,20 +5,28 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from models import ChatRequest, ChatResponse, Document, ChatSession, Message
 from models.settings import Settings
-from rag_service import RAGService
+from rag_service import RAGService, RAGNotReadyError
 from ollama_service import OllamaService
 from chat_service import ChatService
+from status_service import StatusService
+from prompt_builder import PromptBuilder, window_history
+from generation_scheduler import QueueFullError, QueueTimeoutError
+from stream_codec import TokenCoalescer
+import stream_codec
+import config
 import os
 import httpx
 from pathlib import Path
 import logging
 import io
-from typing import List, Optional
+from typing import List, Optional, Set
 import json
 import uuid
 from datetime import datetime
 import asyncio
+import time
 from pydantic import ValidationError
+from contextlib import asynccontextmanager
 
 # Configure logging
 logging.basicConfig(
@@ -34,13 +42,61 @@ logging.getLogger('fastapi').setLevel(logging.WARNING)
 logging.getLogger('httpx').setLevel(logging.WARNING)
 logging.getLogger('rag_service').setLevel(logging.DEBUG)  # Ensure RAG service logs are at DEBUG level
 
-# Load settings
-settings = Settings.load()
+class DisconnectAwareStreamingResponse(StreamingResponse):
+    """
+    A StreamingResponse that closes its generator as soon as the client goes away.
+
+    Starlette stops sending on disconnect but leaves a generator that was
+    waiting to send suspended until it is garbage collected; closing it here
+    runs its cleanup (closing upstream streams, releasing slots) straight away.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.body_iterator.aclose()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start and stop long-lived service resources with the application."""
+    await ollama_service.start()
+    
+    # Load Chroma and the embedding model without holding up startup unless
+    # configured to; until then chat runs without retrieved context
+    if config.get_settings().rag_eager_load:
+        try:
+            await rag_service.awarm_up()
+        except Exception:
+            pass  # Logged by the RAG service; retried below
+    warm_up_task = asyncio.create_task(warm_up_rag())
+    
+    yield
+    warm_up_task.cancel()
+    await ollama_service.close()
+    rag_service.shutdown()
+
+# Seconds before retrying a failed RAG warm-up, doubling up to the maximum
+RAG_WARM_UP_RETRY_INITIAL = 5.0
+RAG_WARM_UP_RETRY_MAX = 300.0
+
+async def warm_up_rag():
+    """Warm up the RAG service in the background, retrying with backoff until it succeeds."""
+    delay = RAG_WARM_UP_RETRY_INITIAL
+    while True:
+        try:
+            await rag_service.awarm_up()
+            return
+        except Exception as e:
+            logger.error(f"RAG warm-up failed; retrieval stays disabled, retrying in {delay:.0f}s: {str(e)}")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, RAG_WARM_UP_RETRY_MAX)
 
 app = FastAPI(
     title="LocalChat - RAG-enabled Chatbot",
     description="A locally run chatbot that combines Ollama's LLM capabilities with RAG",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -64,6 +120,22 @@ templates = Jinja2Templates(directory="templates")
 rag_service = RAGService()
 ollama_service = OllamaService()
 chat_service = ChatService()
+status_service = StatusService(rag_service, chat_service, ollama_service)
+prompt_builder = PromptBuilder()
+
+# Tasks that outlive the request that started them, referenced until done
+background_tasks: Set[asyncio.Task] = set()
+
+def run_in_background(coro) -> asyncio.Task:
+    """Run a coroutine as a task of its own, logging any failure."""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    def done(task: asyncio.Task) -> None:
+        background_tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.error(f"Background task failed: {str(task.exception())}")
+    task.add_done_callback(done)
+    return task
 
 @app.get("/", response_class=HTMLResponse)
 async def chat_page(request: Request):
@@ -91,6 +163,8 @@ async def api_info():
             "chat": "/api/chat",
             "documents": "/api/documents",
             "health": "/api/health",
+            "ready": "/api/ready",
+            "metrics": "/api/metrics",
             "docs": "/docs"
         }
     }
@@ -100,8 +174,8 @@ async def health_check():
     """Health check endpoint."""
     try:
         # Check if Ollama service is available
-        ollama_service = OllamaService(settings.model_name)
-        await ollama_service.check_health()
+        if not await ollama_service.is_available():
+            raise RuntimeError(f"Ollama server at {ollama_service.base_url} is unavailable")
         
         return {
             "status": "healthy",
@@ -114,81 +188,42 @@ async def health_check():
             detail=f"Service unhealthy: {str(e)}"
         )
 
+@app.get("/api/ready")
+async def readiness_check():
+    """Readiness endpoint: 200 once every component is usable, 503 before."""
+    components = {
+        "rag": rag_service.ready,
+        "ollama": await ollama_service.is_available()
+    }
+    ready = all(components.values())
+    body = {"ready": ready, "components": components}
+    if rag_service.warm_up_error:
+        body["error"] = rag_service.warm_up_error
+    return JSONResponse(status_code=200 if ready else 503, content=body)
+
+@app.get("/api/metrics")
+async def metrics():
+    """In-process cache counters."""
+    return {
+        "scheduler": ollama_service.scheduler.stats(),
+        "backends": ollama_service.stats(),
+        "embedding_cache": rag_service.embedding_cache.stats(),
+        "retrieval_cache": {
+            **rag_service.retrieval_cache.stats(),
+            "generation": rag_service.generation
+        },
+        "reranker": rag_service.reranker.stats()
+    }
+
 @app.get("/system/status")
 async def system_status():
     """System status endpoint for Zendesk app integration."""
     try:
-        # Get available models
-        ollama_service = OllamaService()  # Initialize without parameters
-        
-        try:
-            models = await ollama_service.list_models()
-        except Exception as e:
-            logger.error(f"Error listing models: {str(e)}")
-            models = []
-        
-        # Get document and chat counts
-        rag_service = RAGService()
-        try:
-            document_count = len(rag_service.list_documents())
-        except Exception as e:
-            logger.error(f"Error listing documents: {str(e)}")
-            document_count = 0
-        
-        # Get chat count
-        chat_service = ChatService()
-        try:
-            chats = chat_service.list_chats()
-            chat_count = len(chats) if chats else 0
-        except Exception as e:
-            logger.error(f"Error listing chats: {str(e)}")
-            chat_count = 0
-        
-        # Check Ollama status
-        ollama_status = "running"
-        try:
-            await ollama_service.verify_connection()
-        except Exception as e:
-            logger.error(f"Ollama connection check failed: {str(e)}")
-            ollama_status = "error"
-        
-        # Get model names from the response
-        model_names = []
-        
-        # Handle different response formats
-        if isinstance(models, dict):
-            if 'models' in models and isinstance(models['models'], list):
-                # Format: {"models": [{"name": "model1"}, {"name": "model2"}]}
-                model_names = [model.get('name') for model in models['models'] if isinstance(model, dict) and model.get('name')]
-            elif 'models' in models and isinstance(models['models'], str):
-                # Format: {"models": "model1,model2"}
-                model_names = [m.strip() for m in models['models'].split(',')]
-        elif isinstance(models, list):
-            # Format: [{"name": "model1"}, {"name": "model2"}]
-            if all(isinstance(m, dict) for m in models):
-                model_names = [m.get('name') for m in models if m.get('name')]
-            else:
-                # Format: ["model1", "model2"]
-                model_names = [str(m) for m in models if m]
-        elif isinstance(models, str):
-            # Format: "model1,model2"
-            model_names = [m.strip() for m in models.split(',')]
-            
-        # Ensure we have at least the default model
-        if not model_names:
-            model_names = [ollama_service.default_model]
-            
-        return {
-            "status": "ok",
-            "ollama_status": ollama_status,
-            "models_available": model_names,
-            "current_model": ollama_service.default_model,
-            "document_count": document_count,
-            "chat_count": chat_count
-        }
+        return await status_service.get_status()
     except Exception as e:
         logger.error(f"System status check failed: {str(e)}")
         # Get default model from settings as fallback
+        settings = config.get_settings()
         default_model = settings.default_model if hasattr(settings, 'default_model') else "llama3.2:latest"
         return {
             "status": "error",
@@ -204,7 +239,7 @@ async def system_status():
 async def list_models():
     try:
         # Only log important state changes and errors
-        if not await ollama_service.verify_connection():
+        if not await ollama_service.is_available():
             error_msg = f"Could not connect to Ollama server at {ollama_service.base_url}. Please check if Ollama is running."
             logger.error(error_msg)
             raise HTTPException(
@@ -254,11 +289,13 @@ async def http_exception_handler(request: Request, exc: HTTPException):
             "error": exc.detail,
             "path": request.url.path,
             "method": request.method
-        }
+        },
+        headers=getattr(exc, 'headers', None)
     )
 
 @app.post("/api/chat")
 async def chat(request: ChatRequest):
+    ticket = None
     try:
         logger.debug(f"Processing chat request - chat_id: {request.context.get('chat_id') if request.context else 'new'}")
         logger.debug(f"Request messages: {request.messages}")
@@ -270,30 +307,56 @@ async def chat(request: ChatRequest):
                 detail="Either messages or message must be provided"
             )
         
-        if not await ollama_service.verify_connection():
+        if not await ollama_service.is_available():
             raise HTTPException(
                 status_code=503,
                 detail=f"Could not connect to Ollama server at {ollama_service.base_url}. Please check if Ollama is running."
             )
         
+        settings = config.get_settings()
+        model = request.model or ollama_service.default_model
+        
+        def queue_full(e: QueueFullError) -> HTTPException:
+            logger.warning(f"Rejecting chat request: {str(e)}")
+            return HTTPException(
+                status_code=429,
+                detail=str(e),
+                headers={"Retry-After": str(max(1, int(settings.ollama_queue_timeout)))}
+            )
+        
+        # Turn the request away before doing any work if the model's queue is full
+        try:
+            ollama_service.scheduler.check_capacity(model)
+        except QueueFullError as e:
+            raise queue_full(e)
+        
         # Get relevant context from RAG
         try:
-            # Get all user messages to build context
+            # Get the latest user messages to build context
             user_messages = []
-            if request.message:
-                user_messages.append(request.message)
             if request.messages:
                 user_messages.extend([m.content for m in request.messages if m.role == "user"])
+            if request.message:
+                user_messages.append(request.message)
+            user_messages = user_messages[-max(1, settings.retrieval_history_messages):]
             
             if user_messages:
-                # Join all messages with newlines to provide full context
+                # Join the messages with newlines so follow-up questions keep their context
                 context_query = "\n".join(user_messages)
-                context = rag_service.get_relevant_context(context_query)
+                context_documents = await rag_service.aget_relevant_documents(context_query)
             else:
-                context = ""
+                context_documents = []
         except Exception as e:
             logger.warning(f"Error getting RAG context: {str(e)}")
-            context = ""  # Continue without context if RAG fails
+            context_documents = []  # Continue without context if RAG fails
+        
+        # Claim a generation slot, or a place in the queue, once retrieval is
+        # done so it does not hold a slot, but before the chat is written so
+        # a rejected request leaves nothing behind for a retry to repeat
+        try:
+            ticket = ollama_service.scheduler.enqueue(model, priority=request.priority or 0)
+        except QueueFullError as e:
+            raise queue_full(e)
         
         # Create a new chat session if not provided
         chat_id = request.context.get('chat_id') if request.context else None
@@ -329,30 +392,52 @@ async def chat(request: ChatRequest):
                     ))
             
             logger.debug(f"Saving new chat with {len(chat.messages)} messages")
-            chat_service.save_chat(chat)
+            await chat_service.asave_chat(chat)
+            status_service.refresh_chat_count()
         else:
             logger.debug(f"Loading existing chat session: {chat_id}")
-            chat = chat_service.load_chat(chat_id)
+            # Read only the messages that can be sent to the model
+            summary = chat_service.get_chat_summary(chat_id)
+            history = await chat_service.aget_history_window(
+                chat_id,
+                settings.message_history_limit,
+                pin_system=settings.pin_system_messages,
+                pin_first_user=settings.pin_first_user_message
+            ) if summary else None
+            if history is not None:
+                chat = ChatSession(
+                    id=chat_id,
+                    title=summary.title,
+                    messages=history,
+                    model=summary.model,
+                    created_at=summary.created_at,
+                    updated_at=summary.updated_at
+                )
+            else:
+                chat = await chat_service.aload_chat(chat_id)
             if chat:
                 logger.debug(f"Current messages in chat before update: {len(chat.messages)}")
+                new_message = None
                 if request.message:
                     logger.debug(f"Adding new message to existing chat: {request.message}")
-                    chat.messages.append(Message(
+                    new_message = Message(
                         role="user",
                         content=request.message,
                         timestamp=datetime.now().isoformat()
-                    ))
+                    )
                 elif request.messages and request.messages:
                     last_msg = request.messages[-1]
                     logger.debug(f"Adding last message from request to existing chat: {last_msg.content}")
-                    chat.messages.append(Message(
+                    new_message = Message(
                         role=last_msg.role,
                         content=last_msg.content,
                         timestamp=datetime.now().isoformat()
-                    ))
-                chat.updated_at = datetime.now()
-                logger.debug(f"Saving updated chat with {len(chat.messages)} messages")
-                chat_service.save_chat(chat)
+                    )
+                if new_message:
+                    chat.messages.append(new_message)
+                    chat.updated_at = new_message.timestamp
+                    logger.debug(f"Appending message to chat, now {len(chat.messages)} messages")
+                    await chat_service.aappend_message(chat_id, new_message)
         
         if not chat:
             raise HTTPException(
@@ -364,152 +449,165 @@ async def chat(request: ChatRequest):
         current_chat = chat
         logger.debug(f"Current chat has {len(current_chat.messages)} messages before generating response")
         
+        # Window the chat history to the latest messages
+        messages = window_history(
+            [{"role": msg.role, "content": msg.content} for msg in current_chat.messages],
+            settings.message_history_limit,
+            pin_system=settings.pin_system_messages,
+            pin_first_user=settings.pin_first_user_message
+        )
+        
+        # Remove any None messages and duplicates
+        messages = [msg for msg in messages if msg is not None]
+        filtered_messages = []
+        seen_messages = set()
+        for msg in messages:
+            message_key = (msg['role'], msg['content'])
+            if message_key not in seen_messages:
+                filtered_messages.append(msg)
+                seen_messages.add(message_key)
+        messages = filtered_messages
+        
+        # Fit retrieved context and history into the model's context window
+        options = request.options or {}
+        context_window = (options.get('num_ctx') or (options.get('options') or {}).get('num_ctx')
+                          or settings.context_window)
+        prompt = prompt_builder.build(
+            model,
+            history=messages,
+            documents=context_documents,
+            context_window=context_window
+        )
+        messages = prompt.messages
+        logger.info(f"Prompt for chat {chat_id}: {prompt.token_count}/{prompt.budget} tokens, "
+                    f"{prompt.documents_used} context chunks, {prompt.messages_dropped} messages dropped")
+        
+        logger.debug(f"Final message list to send ({len(messages)} messages):")
+        for i, msg in enumerate(messages):
+            logger.debug(f"  {i+1}. role={msg['role']}, content={msg['content'][:100]}...")
+        
+        logger.debug(f"Sending {len(messages)} messages to Ollama")
+        
+        # Prepare the request payload
+        request_payload = {
+            "model": model,
+            "messages": messages,
+            "stream": True,
+            **(request.options or {})
+        }
+        # Run the model with the window the prompt was budgeted for, so
+        # Ollama does not truncate it to its own default
+        request_payload["options"] = {"num_ctx": context_window, **(request_payload.get("options") or {})}
+        
+        async def save_response(content: str) -> None:
+            """Append the assistant's response to the chat log."""
+            response_message = Message(
+                role="assistant",
+                content=content,
+                timestamp=datetime.now().isoformat()
+            )
+            current_chat.messages.append(response_message)
+            # Title the chat after its first exchange; later turns
+            # only see a window of the history
+            title = None
+            if current_chat.title == "New Chat":
+                title = chat_service.generate_chat_title(current_chat.messages)
+            await chat_service.aappend_message(chat_id, response_message, title=title)
+            logger.debug(f"Chat messages after saving response: {len(current_chat.messages)}")
+        
         # Generate response using Ollama with streaming
-        async def generate():
+        async def generate_response():
+            # The reply so far, joined once at the end rather than per token
+            assistant_parts: List[str] = []
+            coalescer = TokenCoalescer(settings.stream_flush_ms, settings.stream_flush_chars)
             try:
-                # Prepare messages for Ollama
-                messages = []
-                if context:
-                    logger.debug(f"Adding RAG context as system message: {context[:100]}...")  # Log first 100 chars
-                    messages.append({"role": "system", "content": context})
-                
-                # Use the current_chat from outer scope
-                chat_messages = [{"role": msg.role, "content": msg.content} for msg in current_chat.messages]
-                logger.debug(f"Adding chat messages: {json.dumps(chat_messages, indent=2)}")
-                messages.extend(chat_messages)
-                
-                # Remove any None messages and duplicates
-                messages = [msg for msg in messages if msg is not None]
-                filtered_messages = []
-                seen_messages = set()
-                for msg in messages:
-                    message_key = (msg['role'], msg['content'])
-                    if message_key not in seen_messages:
-                        filtered_messages.append(msg)
-                        seen_messages.add(message_key)
-                messages = filtered_messages
-                
-                logger.debug(f"Final message list to send ({len(messages)} messages):")
-                for i, msg in enumerate(messages):
-                    logger.debug(f"  {i+1}. role={msg['role']}, content={msg['content'][:100]}...")
-                
-                logger.debug(f"Sending {len(messages)} messages to Ollama")
-                
-                # Configure client with appropriate timeouts
-                timeout = httpx.Timeout(
-                    connect=10.0,  # connection timeout
-                    read=300.0,    # read timeout
-                    write=10.0,    # write timeout
-                    pool=10.0      # pool timeout
-                )
-                
-                # Prepare the request payload
-                request_payload = {
-                    "model": request.model or ollama_service.default_model,
-                    "messages": messages,
-                    "stream": True,
-                    **(request.options or {})
-                }
-                
-                async with httpx.AsyncClient(timeout=timeout) as client:
-                    try:
-                        async with client.stream(
-                            "POST",
-                            f"{ollama_service.base_url}/api/chat",
-                            json=request_payload,
-                            headers={
-                                "Content-Type": "application/json",
-                                "Accept": "application/x-ndjson"
-                            }
-                        ) as response:
-                            response.raise_for_status()
-                            assistant_message = ""
-                            last_activity = datetime.now()
-                            
-                            async for line in response.aiter_lines():
-                                # Check for timeout between chunks
-                                now = datetime.now()
-                                if (now - last_activity).total_seconds() > 30:
-                                    error_msg = "Timeout waiting for model response"
+                async with ollama_service.stream_chat(request_payload) as response:
+                    response.raise_for_status()
+                    last_activity = time.monotonic()
+                    
+                    async for line in response.aiter_lines():
+                        # Check for timeout between chunks
+                        now = time.monotonic()
+                        if now - last_activity > 30:
+                            error_msg = "Timeout waiting for model response"
+                            logger.error(error_msg)
+                            yield f"data: {json.dumps({'error': error_msg})}\n\n"
+                            yield f"data: {json.dumps({'done': True})}\n\n"
+                            return
+                        
+                        last_activity = now
+                        
+                        if line.strip():
+                            try:
+                                data = stream_codec.loads(line)
+                                
+                                # Check for error response
+                                if data.get('error'):
+                                    error_msg = f"Error from Ollama: {data['error']}"
                                     logger.error(error_msg)
                                     yield f"data: {json.dumps({'error': error_msg})}\n\n"
                                     yield f"data: {json.dumps({'done': True})}\n\n"
                                     return
                                 
-                                last_activity = now
+                                # Extract content from message
+                                content = None
+                                if 'message' in data and isinstance(data['message'], dict):
+                                    content = data['message'].get('content', '')
+                                elif 'response' in data:  # Fallback for older Ollama versions
+                                    content = data.get('response', '')
+                                    
+                                if content:
+                                    assistant_parts.append(content)
+                                    event = coalescer.add(content)
+                                    if event:
+                                        yield event
                                 
-                                if line.strip():
-                                    try:
-                                        data = json.loads(line)
-                                        
-                                        # Check for error response
-                                        if data.get('error'):
-                                            error_msg = f"Error from Ollama: {data['error']}"
-                                            logger.error(error_msg)
-                                            yield f"data: {json.dumps({'error': error_msg})}\n\n"
-                                            yield f"data: {json.dumps({'done': True})}\n\n"
-                                            return
-                                        
-                                        # Extract content from message
-                                        content = None
-                                        if 'message' in data and isinstance(data['message'], dict):
-                                            content = data['message'].get('content', '')
-                                        elif 'response' in data:  # Fallback for older Ollama versions
-                                            content = data.get('response', '')
-                                            
-                                        if content:
-                                            assistant_message += content
-                                            yield f"data: {json.dumps({'message': content})}\n\n"
-                                        
-                                        # Check for completion
-                                        if data.get('done'):
-                                            if not assistant_message:
-                                                error_msg = "No response content received from model"
-                                                logger.error(error_msg)
-                                                yield f"data: {json.dumps({'error': error_msg})}\n\n"
-                                                yield f"data: {json.dumps({'done': True})}\n\n"
-                                                return
-                                            
-                                            # Save the complete chat with the assistant's response
-                                            updated_chat = chat_service.load_chat(chat_id)
-                                            if updated_chat:
-                                                logger.debug(f"Chat messages before saving response: {len(updated_chat.messages)}")
-                                                # Check if this response has already been saved
-                                                last_message = updated_chat.messages[-1] if updated_chat.messages else None
-                                                if not last_message or (
-                                                    last_message.role != "assistant" or 
-                                                    last_message.content != assistant_message
-                                                ):
-                                                    logger.debug("Adding new assistant response to chat")
-                                                    updated_chat.messages.append(Message(
-                                                        role="assistant",
-                                                        content=assistant_message,
-                                                        timestamp=datetime.now().isoformat()
-                                                    ))
-                                                    updated_chat.updated_at = datetime.now()
-                                                    updated_chat.title = chat_service.generate_chat_title(updated_chat.messages)
-                                                    chat_service.save_chat(updated_chat)
-                                                    logger.debug(f"Chat messages after saving response: {len(updated_chat.messages)}")
-                                                else:
-                                                    logger.debug("Assistant response already exists in chat, skipping save")
-                                            
-                                            yield f"data: {json.dumps({'done': True, 'context': {'chat_id': chat_id}})}\n\n"
-                                            return
-                                        
-                                    except json.JSONDecodeError as e:
-                                        error_msg = f"Error parsing JSON from Ollama: {str(e)}"
-                                        logger.error(f"{error_msg}. Raw line: {line}")
+                                # Check for completion
+                                if data.get('done'):
+                                    event = coalescer.flush()
+                                    if event:
+                                        yield event
+                                    assistant_message = "".join(assistant_parts)
+                                    if not assistant_message:
+                                        error_msg = "No response content received from model"
+                                        logger.error(error_msg)
                                         yield f"data: {json.dumps({'error': error_msg})}\n\n"
                                         yield f"data: {json.dumps({'done': True})}\n\n"
                                         return
-                                        
-                    except httpx.HTTPStatusError as e:
-                        error_msg = f"HTTP error from Ollama: {str(e)}. Response: {e.response.text if hasattr(e, 'response') else 'No response'}"
-                        logger.error(error_msg)
-                        yield f"data: {json.dumps({'error': error_msg})}\n\n"
-                        yield f"data: {json.dumps({'done': True})}\n\n"
-                        return
-                        
+                                    
+                                    await save_response(assistant_message)
+                                    
+                                    yield f"data: {json.dumps({'done': True, 'context': {'chat_id': chat_id}, 'prompt_tokens': prompt.token_count})}\n\n"
+                                    return
+                                
+                            except json.JSONDecodeError as e:
+                                error_msg = f"Error parsing JSON from Ollama: {str(e)}"
+                                logger.error(f"{error_msg}. Raw line: {line}")
+                                yield f"data: {json.dumps({'error': error_msg})}\n\n"
+                                yield f"data: {json.dumps({'done': True})}\n\n"
+                                return
+                                
+            except (asyncio.CancelledError, GeneratorExit):
+                # The client disconnected; leaving the stream above has
+                # already closed the connection, which stops the generation
+                assistant_message = "".join(assistant_parts)
+                saved = bool(assistant_message) and settings.persist_partial_responses
+                if saved:
+                    # In a task of its own: this one is being cancelled
+                    # or closed and can no longer wait for the write
+                    run_in_background(save_response(assistant_message))
+                logger.info(f"Client disconnected from chat {chat_id}; stopped generation after "
+                            f"{len(assistant_message)} characters, partial response "
+                            f"{'saved' if saved else 'discarded'}")
+                raise
+                
+            except httpx.HTTPStatusError as e:
+                error_msg = f"HTTP error from Ollama: {str(e)}. Response: {e.response.text if hasattr(e, 'response') else 'No response'}"
+                logger.error(error_msg)
+                yield f"data: {json.dumps({'error': error_msg})}\n\n"
+                yield f"data: {json.dumps({'done': True})}\n\n"
+                return
+                
             except httpx.ConnectTimeout as e:
                 error_msg = f"Connection timeout to Ollama server at {ollama_service.base_url}: {str(e)}"
                 logger.error(error_msg)
@@ -531,12 +629,42 @@ async def chat(request: ChatRequest):
                 yield f"data: {json.dumps({'done': True})}\n\n"
                 return
 
-        return StreamingResponse(
+        async def generate():
+            events = generate_response()
+            cancelled = False
+            try:
+                # Report the queue position until a generation slot is free
+                try:
+                    async for position in ticket.wait():
+                        yield f"data: {json.dumps({'queue_position': position})}\n\n"
+                except QueueTimeoutError as e:
+                    logger.warning(f"Chat {chat_id} timed out in the queue: {str(e)}")
+                    yield f"data: {json.dumps({'error': str(e), 'status': 503})}\n\n"
+                    yield f"data: {json.dumps({'done': True})}\n\n"
+                    return
+                
+                async for event in events:
+                    yield event
+            except (asyncio.CancelledError, GeneratorExit):
+                cancelled = True
+                raise
+            finally:
+                # Stop the generation before giving its slot to the next request
+                await events.aclose()
+                ticket.release(cancelled=cancelled)
+
+        return DisconnectAwareStreamingResponse(
             generate(),
             media_type="text/event-stream"
         )
 
+    except HTTPException:
+        if ticket is not None:
+            ticket.release()
+        raise
     except Exception as e:
+        if ticket is not None:
+            ticket.release()
         logger.error(f"Error in chat endpoint: {str(e)}", exc_info=True)
         raise HTTPException(
             status_code=500,
@@ -544,11 +672,23 @@ async def chat(request: ChatRequest):
         )
 
 @app.get("/api/chats")
-async def list_chats():
-    """List all saved chat sessions."""
+async def list_chats(
+    limit: Optional[int] = None,
+    offset: int = 0,
+    sort: str = "updated_at",
+    order: str = "desc"
+):
+    """List saved chat sessions, one page at a time."""
     try:
-        chats = chat_service.list_chats()
-        return {"chats": chats}
+        chats = chat_service.list_chats(
+            limit=limit,
+            offset=offset,
+            sort_by=sort,
+            descending=order.lower() != "asc"
+        )
+        return {"chats": chats, "total": chat_service.count_chats()}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error listing chats: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -566,20 +706,49 @@ async def create_chat():
             created_at=datetime.now(),
             updated_at=datetime.now()
         )
-        chat_service.save_chat(chat)
+        await chat_service.asave_chat(chat)
+        status_service.refresh_chat_count()
         return {"chat_id": chat_id}
     except Exception as e:
         logger.error(f"Error creating chat: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/chats/{chat_id}")
-async def get_chat(chat_id: str):
-    """Get a specific chat session."""
+async def get_chat(
+    chat_id: str,
+    limit: Optional[int] = None,
+    before: Optional[int] = None,
+    after: Optional[int] = None,
+    since: Optional[datetime] = None
+):
+    """
+    Get a specific chat session.
+    
+    Without paging parameters the whole conversation is returned. With any
+    of limit, before, after or since only that page of messages is returned,
+    along with its position (start_index), the chat's total message count
+    and whether more messages match (has_more).
+    """
     try:
-        chat = chat_service.load_chat(chat_id)
-        if not chat:
+        if limit is None and before is None and after is None and since is None:
+            chat = await chat_service.aload_chat(chat_id)
+            if not chat:
+                raise HTTPException(status_code=404, detail=f"Chat {chat_id} not found")
+            return chat
+        
+        summary = chat_service.get_chat_summary(chat_id)
+        page = await chat_service.aget_messages(chat_id, limit=limit, before=before, after=after, since=since)
+        if not summary or not page:
             raise HTTPException(status_code=404, detail=f"Chat {chat_id} not found")
-        return chat
+        return {
+            **summary.dict(exclude={'message_count'}),
+            "messages": page.messages,
+            "start_index": page.start_index,
+            "total_messages": page.total,
+            "has_more": page.has_more
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error loading chat: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -588,8 +757,9 @@ async def get_chat(chat_id: str):
 async def delete_chat(chat_id: str):
     """Delete a chat session."""
     try:
-        success = chat_service.delete_chat(chat_id)
+        success = await chat_service.adelete_chat(chat_id)
         if success:
+            status_service.refresh_chat_count()
             return {"status": "success", "message": f"Deleted chat {chat_id}"}
         else:
             raise HTTPException(status_code=404, detail=f"Chat {chat_id} not found")
@@ -598,18 +768,37 @@ async def delete_chat(chat_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/documents")
-async def list_documents():
+async def list_documents(offset: int = 0, limit: Optional[int] = None):
+    """List document IDs and metadata; fetch content with GET /api/documents/{doc_id}."""
     try:
-        documents = rag_service.list_documents()
-        return {"documents": documents}
+        documents = await rag_service.alist_documents(offset=offset, limit=limit)
+        total = await rag_service.acount_documents()
+        return {"documents": documents, "total": total}
     except Exception as e:
         logger.error(f"Error listing documents: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/documents/{doc_id}")
+async def get_document(doc_id: str):
+    """Get one document's full content."""
+    try:
+        document = await rag_service.aget_document(doc_id)
+        if not document:
+            raise HTTPException(status_code=404, detail=f"Document {doc_id} not found")
+        return document
+    except HTTPException:
+        raise
+    except RAGNotReadyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error loading document: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/api/documents")
 async def add_documents(files: List[UploadFile] = File(...)):
     try:
         # Get allowed file types from settings
+        settings = config.get_settings()
         allowed_extensions = settings.allowed_file_types.split(',')
         max_file_size_mb = settings.max_file_size
         max_file_size_bytes = max_file_size_mb * 1024 * 1024  # Convert MB to bytes
@@ -659,11 +848,17 @@ async def add_documents(files: List[UploadFile] = File(...)):
         if not documents:
             raise HTTPException(status_code=400, detail="No valid documents to add")
         
-        rag_service.add_documents(documents)
-        return {"status": "success", "message": f"Added {len(documents)} documents"}
+        def log_progress(documents_done: int, documents_total: Optional[int], chunks_added: int):
+            logger.info(f"Ingestion progress: {documents_done}/{documents_total} documents, {chunks_added} chunks embedded")
+        
+        chunk_count = await rag_service.aadd_documents(documents, progress_callback=log_progress)
+        await status_service.refresh_document_count()
+        return {"status": "success", "message": f"Added {len(documents)} documents", "chunks": chunk_count}
     except HTTPException as e:
         # Re-raise HTTP exceptions
         raise e
+    except RAGNotReadyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Error adding documents: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -671,11 +866,14 @@ async def add_documents(files: List[UploadFile] = File(...)):
 @app.delete("/api/documents/{doc_id}")
 async def delete_document(doc_id: str):
     try:
-        success = rag_service.delete_document(doc_id)
+        success = await rag_service.adelete_document(doc_id)
         if success:
+            await status_service.refresh_document_count()
             return {"status": "success", "message": f"Deleted document {doc_id}"}
         else:
             raise HTTPException(status_code=404, detail=f"Document {doc_id} not found")
+    except RAGNotReadyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Error deleting document: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -683,20 +881,22 @@ async def delete_document(doc_id: str):
 # Settings API endpoints
 @app.get("/api/settings")
 async def get_settings():
-    return settings.dict()
+    return config.get_settings().dict()
 
 @app.post("/api/settings")
 async def update_settings(new_settings: Settings):
     try:
+        settings = config.get_settings()
+        # Only fields sent by the client change; the rest keep their current values
+        updated_settings = settings.model_copy(update=new_settings.dict(exclude_unset=True))
+        
+        # Save to file and publish the new snapshot to all services
+        updated_settings.save()
+        config.invalidate_settings()
+        
         # If Ollama server URL changed, reinitialize the service
-        if new_settings.api_endpoint != settings.api_endpoint or new_settings.default_model != settings.default_model:
-            logger.info(f"Updating Ollama settings - server: {new_settings.api_endpoint}, model: {new_settings.default_model}")
-            # Update all settings
-            for field, value in new_settings.dict().items():
-                setattr(settings, field, value)
-            
-            # Save to file
-            settings.save()
+        if updated_settings.api_endpoint != settings.api_endpoint or updated_settings.default_model != settings.default_model:
+            logger.info(f"Updating Ollama settings - server: {updated_settings.api_endpoint}, model: {updated_settings.default_model}")
             
             # Force OllamaService to refresh its settings
             ollama_service._refresh_settings()
@@ -705,14 +905,8 @@ async def update_settings(new_settings: Settings):
             if not await ollama_service.verify_connection():
                 raise HTTPException(
                     status_code=400,
-                    detail=f"Could not connect to Ollama server at {new_settings.api_endpoint}"
+                    detail=f"Could not connect to Ollama server at {updated_settings.api_endpoint}"
                 )
-        else:
-            # Update all settings
-            for field, value in new_settings.dict().items():
-                setattr(settings, field, value)
-            # Save to file
-            settings.save()
         
         return {"message": "Settings updated successfully"}
     except Exception as e:
@@ -721,14 +915,16 @@ async def update_settings(new_settings: Settings):
 
 @app.post("/api/settings/reset")
 async def reset_settings():
-    settings.reset()
+    Settings().save()
+    config.invalidate_settings()
+    ollama_service._refresh_settings()
     return {"message": "Settings reset to defaults"}
 
 @app.get("/api/default-model")
 async def get_default_model():
     """Get the default model from settings."""
     try:
-        return {"default_model": settings.default_model}
+        return {"default_model": config.get_settings().default_model}
     except Exception as e:
         logger.error(f"Error getting default model: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -740,50 +936,69 @@ async def chat_direct(request: ChatRequest):
     return await chat(request)
 
 @app.get("/chat/history")
-async def chat_history(chat_id: Optional[str] = None):
-    """Chat history endpoint for Zendesk app integration."""
+async def chat_history(
+    chat_id: Optional[str] = None,
+    limit: Optional[int] = None,
+    before: Optional[int] = None,
+    after: Optional[int] = None,
+    since: Optional[datetime] = None
+):
+    """
+    Chat history endpoint for Zendesk app integration.
+    
+    With chat_id, returns that chat's messages, optionally paged by position
+    (limit, before, after) or time (since). Without chat_id, returns messages
+    from the most recently updated chats, newest chats first, up to limit
+    messages (default 100) and only from chats updated after since if given.
+    """
+    def format_message(chat_id: str, index: int, msg: Message) -> dict:
+        return {
+            "id": f"{chat_id}_{index}",
+            "chat_id": chat_id,
+            "role": msg.role,
+            "content": msg.content,
+            "created_at": msg.timestamp.isoformat() if msg.timestamp else datetime.now().isoformat(),
+            "metadata": getattr(msg, 'metadata', None)
+        }
+    
     try:
-        chat_service = ChatService()
-        
         if chat_id:
             # Get messages for a specific chat
-            chat = chat_service.load_chat(chat_id)
-            if not chat or not chat.messages:
+            page = await chat_service.aget_messages(chat_id, limit=limit, before=before, after=after, since=since)
+            if not page:
                 return {"messages": []}
             
-            # Format messages for the response
-            formatted_messages = []
-            for i, msg in enumerate(chat.messages):
-                formatted_messages.append({
-                    "id": getattr(msg, 'id', f"{chat_id}_{i}"),  # Generate an ID if not present
-                    "chat_id": chat_id,
-                    "role": msg.role,
-                    "content": msg.content,
-                    "created_at": msg.timestamp.isoformat() if hasattr(msg, 'timestamp') and msg.timestamp else datetime.now().isoformat(),
-                    "metadata": getattr(msg, 'metadata', None)
-                })
-            
-            return {"messages": formatted_messages}
+            return {
+                "messages": [
+                    format_message(chat_id, page.start_index + i, msg)
+                    for i, msg in enumerate(page.messages)
+                ],
+                "total": page.total,
+                "has_more": page.has_more
+            }
         else:
-            # Get all chats and their messages
-            chats = chat_service.list_chats()
+            # Get messages from the most recently updated chats
+            limit = limit if limit is not None else 100
             all_messages = []
+            has_more = False
             
-            for chat in chats:
-                if not chat.messages:
+            for summary in chat_service.list_chats(limit=limit, updated_after=since):
+                remaining = limit - len(all_messages)
+                if remaining <= 0:
+                    has_more = True
+                    break
+                page = await chat_service.aget_messages(summary.id, limit=remaining, since=since)
+                if not page:
                     continue
-                    
-                for i, msg in enumerate(chat.messages):
-                    all_messages.append({
-                        "id": getattr(msg, 'id', f"{chat.id}_{i}"),  # Generate an ID if not present
-                        "chat_id": chat.id,
-                        "role": msg.role,
-                        "content": msg.content,
-                        "created_at": msg.timestamp.isoformat() if hasattr(msg, 'timestamp') and msg.timestamp else datetime.now().isoformat(),
-                        "metadata": getattr(msg, 'metadata', None)
-                    })
+                all_messages.extend(
+                    format_message(summary.id, page.start_index + i, msg)
+                    for i, msg in enumerate(page.messages)
+                )
+                if page.has_more:
+                    has_more = True
+                    break
             
-            return {"messages": all_messages}
+            return {"messages": all_messages, "has_more": has_more}
     except Exception as e:
         logger.error(f"Error getting chat history: {str(e)}")
         return {"messages": [], "error": str(e)}
@@ -795,4 +1010,9 @@ async def delete_chat_direct(chat_id: str):
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+    workers = config.get_settings().workers
+    if workers > 1:
+        # Worker processes import the app themselves
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
@@ -1,14 +1,17 @@
 # This file makes the models directory a Python package 
 
-from .chat import ChatRequest, ChatResponse, ChatSession, Message
-from .document import Document
+from .chat import ChatRequest, ChatResponse, ChatSession, ChatSummary, Message, MessagePage
+from .document import Document, DocumentSummary
 from .settings import Settings
 
 __all__ = [
     'ChatRequest',
     'ChatResponse',
     'ChatSession',
+    'ChatSummary',
     'Message',
+    'MessagePage',
     'Document',
+    'DocumentSummary',
     'Settings'
 ] 
\ No newline at end of file
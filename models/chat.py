@@ -5,6 +5,7 @@ from datetime import datetime
 class Message(BaseModel):
     role: str
     content: str
+    timestamp: Optional[datetime] = None
 
 class ChatRequest(BaseModel):
     model: Optional[str] = None
@@ -13,6 +14,7 @@ class ChatRequest(BaseModel):
     context: Optional[Dict[str, Any]] = None
     stream: Optional[bool] = True
     options: Optional[Dict[str, Any]] = None
+    priority: Optional[int] = 0  # Higher values are admitted first when generations queue
 
 class ChatResponse(BaseModel):
     message: str
@@ -24,4 +26,18 @@ class ChatSession(BaseModel):
     messages: List[Message]
     model: str
     created_at: datetime = datetime.now()
-    updated_at: datetime = datetime.now() 
\ No newline at end of file
+    updated_at: datetime = datetime.now()
+
+class ChatSummary(BaseModel):
+    id: str
+    title: str
+    model: str
+    created_at: datetime
+    updated_at: datetime
+    message_count: int = 0
+
+class MessagePage(BaseModel):
+    messages: List[Message]
+    start_index: int  # Position of the first returned message in the chat
+    total: int  # Number of messages in the chat
+    has_more: bool  # Whether more messages match beyond this page
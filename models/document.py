@@ -5,4 +5,8 @@ class Document(BaseModel):
     id: Optional[str] = None
     content: str = Field(..., description="The content of the document")
     metadata: Dict[str, Any] = {}
-    embedding: Optional[List[float]] = Field(None, description="Vector embedding of the document") 
\ No newline at end of file
+    embedding: Optional[List[float]] = Field(None, description="Vector embedding of the document")
+
+class DocumentSummary(BaseModel):
+    id: str
+    metadata: Dict[str, Any] = {}
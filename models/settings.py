@@ -15,9 +15,63 @@ class Settings(BaseModel):
         # Remove trailing slash if present to avoid double slashes in URLs
         return self.api_endpoint.rstrip('/')
     
+    # Comma-separated Ollama URLs to balance generations across; empty uses api_endpoint
+    ollama_backends: str = Field(default="", env='OLLAMA_BACKENDS')
+    ollama_eject_seconds: float = Field(default=30.0, env='OLLAMA_EJECT_SECONDS')
+    ollama_max_connections: int = Field(default=100, env='OLLAMA_MAX_CONNECTIONS')
+    ollama_max_keepalive_connections: int = Field(default=20, env='OLLAMA_MAX_KEEPALIVE_CONNECTIONS')
+    ollama_keepalive_expiry: float = Field(default=30.0, env='OLLAMA_KEEPALIVE_EXPIRY')
+    ollama_http2: bool = Field(default=True, env='OLLAMA_HTTP2')
+    ollama_health_interval: float = Field(default=10.0, env='OLLAMA_HEALTH_INTERVAL')
+    ollama_health_ttl: float = Field(default=30.0, env='OLLAMA_HEALTH_TTL')
+    ollama_max_in_flight: int = Field(default=2, env='OLLAMA_MAX_IN_FLIGHT')
+    ollama_queue_size: int = Field(default=32, env='OLLAMA_QUEUE_SIZE')
+    ollama_queue_timeout: float = Field(default=60.0, env='OLLAMA_QUEUE_TIMEOUT')
+    
     # RAG settings
     embedding_model: str = Field(default="all-minilm", env='EMBEDDING_MODEL')
+    embedding_backend: str = Field(default="local", env='EMBEDDING_BACKEND')  # "local" or "ollama"
     chroma_persist_directory: str = Field(default="./data/chroma", env='CHROMA_PERSIST_DIRECTORY')
+    chroma_server_url: str = Field(default="", env='CHROMA_SERVER_URL')
+    chunk_size: int = Field(default=1000, env='CHUNK_SIZE')
+    chunk_overlap: int = Field(default=200, env='CHUNK_OVERLAP')
+    embedding_batch_size: int = Field(default=64, env='EMBEDDING_BATCH_SIZE')
+    rag_worker_threads: int = Field(default=2, env='RAG_WORKER_THREADS')
+    rag_eager_load: bool = Field(default=False, env='RAG_EAGER_LOAD')
+    embedding_cache_size: int = Field(default=1024, env='EMBEDDING_CACHE_SIZE')
+    embedding_cache_path: str = Field(default="", env='EMBEDDING_CACHE_PATH')
+    retrieval_cache_size: int = Field(default=256, env='RETRIEVAL_CACHE_SIZE')
+    rerank_enabled: bool = Field(default=False, env='RERANK_ENABLED')
+    rerank_model: str = Field(default="cross-encoder/ms-marco-MiniLM-L-6-v2", env='RERANK_MODEL')
+    rerank_candidates: int = Field(default=20, env='RERANK_CANDIDATES')
+    rerank_top_n: int = Field(default=3, env='RERANK_TOP_N')
+    rerank_batch_size: int = Field(default=8, env='RERANK_BATCH_SIZE')
+    rerank_time_budget_ms: float = Field(default=150.0, env='RERANK_TIME_BUDGET_MS')
+    # BM25 score at which a keyword hit is kept below the semantic relevance threshold
+    keyword_min_score: float = Field(default=8.0, env='KEYWORD_MIN_SCORE')
+    
+    # Prompt settings
+    context_window: int = Field(default=4096, env='CONTEXT_WINDOW')
+    response_token_reserve: int = Field(default=512, env='RESPONSE_TOKEN_RESERVE')
+    context_token_share: float = Field(default=0.5, env='CONTEXT_TOKEN_SHARE')
+    tokenizer_name: str = Field(default="", env='TOKENIZER_NAME')
+    pin_system_messages: bool = Field(default=True, env='PIN_SYSTEM_MESSAGES')
+    pin_first_user_message: bool = Field(default=False, env='PIN_FIRST_USER_MESSAGE')
+    retrieval_history_messages: int = Field(default=3, env='RETRIEVAL_HISTORY_MESSAGES')
+    
+    # Streaming settings; 0 sends every token as its own event
+    stream_flush_ms: float = Field(default=0.0, env='STREAM_FLUSH_MS')
+    stream_flush_chars: int = Field(default=0, env='STREAM_FLUSH_CHARS')
+    
+    # Server settings
+    workers: int = Field(default=1, env='WORKERS')
+    
+    # Status settings
+    status_cache_ttl: float = Field(default=5.0, env='STATUS_CACHE_TTL')
+    
+    # Chat storage settings
+    chat_compaction_interval: int = Field(default=50, env='CHAT_COMPACTION_INTERVAL')
+    persist_partial_responses: bool = Field(default=True, env='PERSIST_PARTIAL_RESPONSES')
     
     # UI settings
     message_history_limit: int = Field(default=50, env='MESSAGE_HISTORY_LIMIT')
@@ -47,11 +101,13 @@ class Settings(BaseModel):
                             key_lower = 'api_endpoint'
                         
                         if hasattr(settings, key_lower) and not isinstance(getattr(settings.__class__, key_lower, None), property):
-                            # Convert value to appropriate type
-                            if key_lower in ['message_history_limit', 'max_file_size']:
-                                value = int(value)
-                            elif key_lower == 'auto_scroll':
+                            # Convert value to the field's declared type
+                            field = cls.model_fields.get(key_lower)
+                            field_type = field.annotation if field else str
+                            if field_type is bool:
                                 value = value.lower() == 'true'
+                            elif field_type in (int, float):
+                                value = field_type(value)
                             setattr(settings, key_lower, value)
         
         return settings
@@ -84,9 +140,14 @@ class Settings(BaseModel):
             else:
                 env_content.append(f"{key.upper()}={value}")
         
-        # Write back to .env
-        with open(env_path, 'w') as f:
+        # Write back to .env through a temporary file, so other worker
+        # processes reloading it never read a half-written file
+        tmp_path = env_path.with_name(f".env.{os.getpid()}.tmp")
+        with open(tmp_path, 'w') as f:
             f.write('\n'.join(env_content) + '\n')
+        if env_path.exists():
+            os.chmod(tmp_path, env_path.stat().st_mode & 0o777)
+        os.replace(tmp_path, env_path)
 
     def reset(self):
         """Reset settings to defaults and save to .env."""
@@ -1,90 +1,358 @@
 import httpx
-from typing import List, Optional, Dict, Any
+import numpy as np
+from typing import AsyncIterator, List, Optional, Dict, Any
 from models import Message, ChatRequest, ChatResponse
 from config import get_settings
+from generation_scheduler import GenerationScheduler
+from contextlib import asynccontextmanager
+import asyncio
 import logging
+import time
 from datetime import datetime
 
+try:
+    import h2  # noqa: F401  # Enables HTTP/2 support in httpx
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+# Timeouts for streamed generations; reads can stall while the model loads
+CHAT_STREAM_TIMEOUT = httpx.Timeout(
+    connect=10.0,  # connection timeout
+    read=300.0,    # read timeout
+    write=10.0,    # write timeout
+    pool=10.0      # pool timeout
+)
+
+# Embedding requests; the first one may wait for Ollama to load the model
+EMBED_TIMEOUT = httpx.Timeout(120.0, connect=10.0)
+
+class OllamaBackend:
+    """One Ollama server in the pool, with its health and load as seen from this process."""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip('/')
+        self.healthy: Optional[bool] = None
+        self.checked_at = 0.0
+        self.ejected_until = 0.0
+        self.outstanding = 0
+        self.loaded_models: set = set()
+
+    @property
+    def ejected(self) -> bool:
+        return time.monotonic() < self.ejected_until
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "ejected": self.ejected,
+            "outstanding": self.outstanding,
+            "loaded_models": sorted(self.loaded_models)
+        }
+
+
 class OllamaService:
     def __init__(self, base_url: str = None):
+        self._client: Optional[httpx.AsyncClient] = None
+        # Ollama servers by URL; each caches its availability, maintained by
+        # the health monitor and updated by the outcome of real requests
+        self._backends: Dict[str, OllamaBackend] = {}
+        self._health_task: Optional[asyncio.Task] = None
+        # Admission control for generations; each backend adds capacity
+        self.scheduler = GenerationScheduler(
+            slots_per_model=lambda: get_settings().ollama_max_in_flight * max(1, len(self.available_backends()))
+        )
         self._refresh_settings()
-        logger.info(f"Initialized OllamaService with base_url: {self.base_url}, default_model: {self.default_model}")
+        logger.info(f"Initialized OllamaService with backends: {', '.join(self._backends)}, default_model: {self.default_model}")
+
+    def _create_client(self) -> httpx.AsyncClient:
+        """Create the pooled HTTP client shared by all Ollama requests."""
+        settings = get_settings()
+        limits = httpx.Limits(
+            max_connections=settings.ollama_max_connections,
+            max_keepalive_connections=settings.ollama_max_keepalive_connections,
+            keepalive_expiry=settings.ollama_keepalive_expiry
+        )
+        http2 = settings.ollama_http2 and HTTP2_AVAILABLE
+        logger.info(f"Creating Ollama connection pool - limits: {limits}, http2: {http2}")
+        return httpx.AsyncClient(limits=limits, http2=http2, timeout=30.0)
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """The shared pooled client, created on first use if start() was not called."""
+        if self._client is None or self._client.is_closed:
+            self._client = self._create_client()
+        return self._client
+
+    async def start(self) -> None:
+        """Open the connection pool and start the health monitor; called at application startup."""
+        self.client
+        if self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_monitor())
+
+    async def close(self) -> None:
+        """Stop the health monitor and close the connection pool; called at application shutdown."""
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            logger.info("Closed Ollama connection pool")
 
     def _refresh_settings(self):
         """Refresh settings from the current configuration."""
         settings = get_settings()
-        # Ensure base_url doesn't have a trailing slash to avoid double slashes in URLs
-        self.base_url = settings.api_endpoint.rstrip('/')
+        urls = [url.strip().rstrip('/') for url in settings.ollama_backends.split(',') if url.strip()]
+        if not urls:
+            # Ensure base_url doesn't have a trailing slash to avoid double slashes in URLs
+            urls = [settings.api_endpoint.rstrip('/')]
+        # Keep the state of backends that are still configured
+        self._backends = {url: self._backends.get(url) or OllamaBackend(url) for url in urls}
+        self.base_url = urls[0]
         self.default_model = settings.default_model
-        logger.info(f"Refreshed settings - base_url: {self.base_url}, default_model: {self.default_model}")
+        logger.debug(f"Refreshed settings - backends: {urls}, default_model: {self.default_model}")
+
+    @property
+    def backends(self) -> List[OllamaBackend]:
+        return list(self._backends.values())
+
+    def available_backends(self) -> List[OllamaBackend]:
+        """Backends that are not ejected and not known to be down."""
+        return [b for b in self.backends if not b.ejected and b.healthy is not False]
+
+    async def _health_monitor(self) -> None:
+        """Probe the Ollama servers on a fixed interval to keep the cached state fresh."""
+        while True:
+            await self.verify_connection()
+            await asyncio.sleep(get_settings().ollama_health_interval)
+
+    def _record_health(self, backend: OllamaBackend, healthy: bool) -> None:
+        """Update a backend's cached availability, logging transitions."""
+        if healthy != backend.healthy:
+            if healthy:
+                logger.info(f"Ollama server at {backend.url} is available")
+            else:
+                logger.warning(f"Ollama server at {backend.url} is unavailable")
+        backend.healthy = healthy
+        backend.checked_at = time.monotonic()
+        if healthy:
+            backend.ejected_until = 0.0
+
+    def mark_unhealthy(self, backend: Optional[OllamaBackend] = None) -> None:
+        """
+        Flag a server as down after a failed request, without waiting for the next probe.
+
+        The backend is ejected from routing for ollama_eject_seconds, or
+        until a health probe finds it up again. Without a backend, flags all.
+        """
+        for b in [backend] if backend else self.backends:
+            self._record_health(b, False)
+            b.ejected_until = time.monotonic() + get_settings().ollama_eject_seconds
+
+    async def is_available(self) -> bool:
+        """
+        Return whether any Ollama server is reachable.
+
+        Answers from the cached state while it is younger than
+        ollama_health_ttl seconds and only probes the servers once it expires,
+        so the chat path normally makes no extra request.
+        """
+        ttl = get_settings().ollama_health_ttl
+        now = time.monotonic()
+        fresh = [b for b in self.backends if b.healthy is not None and now - b.checked_at < ttl]
+        if any(b.healthy for b in fresh):
+            return True
+        if len(fresh) == len(self.backends):
+            return False
+        return await self.verify_connection()
 
     async def list_models(self) -> Dict[str, Any]:
-        """List all available models from the Ollama server."""
+        """List the models available on any of the Ollama servers."""
+        # Refresh settings to ensure we have the latest values
+        self._refresh_settings()
+        backends = self.available_backends() or self.backends
+        results = await asyncio.gather(*(self._list_backend_models(b) for b in backends), return_exceptions=True)
+        
+        models = set()
+        errors = []
+        for result in results:
+            if isinstance(result, Exception):
+                errors.append(result)
+            else:
+                models.update(result)
+        if len(errors) == len(results):
+            # Nothing reachable; surface the first failure as before
+            raise errors[0]
+        
+        # Ensure default model is in the list
+        if self.default_model not in models:
+            models.add(self.default_model)
+            logger.info(f"Added default model: {self.default_model}")
+
+        # Sort models
+        models = sorted(models)
+        logger.info(f"Final list of models: {models}")
+        return {
+            "models": models,
+            "default_model": self.default_model
+        }
+
+    async def _list_backend_models(self, backend: OllamaBackend) -> List[str]:
+        """List the models pulled on one server, via /api/tags."""
         try:
-            # Refresh settings to ensure we have the latest values
-            self._refresh_settings()
-            logger.info(f"Refreshed settings - base_url: {self.base_url}, default_model: {self.default_model}")
-            
-            logger.info(f"Attempting to list models from {self.base_url}")
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                # Use the /api/tags endpoint to list models
-                logger.info("Trying /api/tags endpoint...")
-                # Ensure no double slashes in URL
-                tags_url = f"{self.base_url}/api/tags".replace("//api", "/api")
-                logger.info(f"Request URL: {tags_url}")
-                response = await client.get(tags_url)
-                response.raise_for_status()
-                data = response.json()
-                logger.info(f"Tags endpoint response: {data}")
-                
-                models = []
-                if 'models' in data:
-                    for model in data['models']:
-                        if 'name' in model:
-                            models.append(model['name'])
-                            logger.info(f"Found model: {model['name']}")
-                
-                # Ensure default model is in the list
-                if self.default_model not in models:
-                    models.append(self.default_model)
-                    logger.info(f"Added default model: {self.default_model}")
-
-                # Sort models
-                models.sort()
-                
-                logger.info(f"Final list of models: {models}")
-                return {
-                    "models": models,
-                    "default_model": self.default_model
-                }
-                
+            logger.info(f"Attempting to list models from {backend.url}")
+            response = await self.client.get(f"{backend.url}/api/tags", timeout=30.0)
+            response.raise_for_status()
+            data = response.json()
+            logger.debug(f"Tags endpoint response from {backend.url}: {data}")
+            self._record_health(backend, True)
+            return [model['name'] for model in data.get('models', []) if 'name' in model]
         except httpx.ConnectError as e:
-            logger.error(f"Could not connect to Ollama server at {self.base_url}. Error: {str(e)}")
+            logger.error(f"Could not connect to Ollama server at {backend.url}. Error: {str(e)}")
+            self.mark_unhealthy(backend)
             raise
         except httpx.HTTPStatusError as e:
             logger.error(f"HTTP error listing models: {str(e)}. Response: {e.response.text if hasattr(e, 'response') else 'No response text'}")
             raise
         except Exception as e:
-            logger.error(f"Error listing models: {str(e)}")
+            logger.error(f"Error listing models from {backend.url}: {str(e)}")
             raise
 
     async def verify_connection(self) -> bool:
-        """Verify that the Ollama server is accessible."""
+        """Verify that at least one Ollama server is accessible, refreshing every server's state."""
+        # Refresh settings to ensure we have the latest values
+        self._refresh_settings()
+        results = await asyncio.gather(*(self._probe(b) for b in self.backends))
+        return any(results)
+
+    async def _probe(self, backend: OllamaBackend) -> bool:
+        """Check one server and record which models it has loaded (/api/ps)."""
+        try:
+            logger.debug(f"Verifying connection to Ollama server at {backend.url}")
+            response = await self.client.get(f"{backend.url}/api/version", timeout=5.0)
+            response.raise_for_status()
+            logger.debug(f"Successfully connected to Ollama server. Version: {response.json()}")
+            self._record_health(backend, True)
+        except Exception as e:
+            logger.error(f"Error verifying Ollama connection to {backend.url}: {str(e)}")
+            self._record_health(backend, False)
+            return False
+        
         try:
-            # Refresh settings to ensure we have the latest values
-            self._refresh_settings()
-            logger.info(f"Verifying connection to Ollama server at {self.base_url}")
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                # Ensure no double slashes in URL
-                version_url = f"{self.base_url}/api/version".replace("//api", "/api")
-                logger.info(f"Request URL: {version_url}")
-                response = await client.get(version_url)
-                response.raise_for_status()
-                version_data = response.json()
-                logger.info(f"Successfully connected to Ollama server. Version: {version_data}")
-                return True
+            response = await self.client.get(f"{backend.url}/api/ps", timeout=5.0)
+            response.raise_for_status()
+            backend.loaded_models = {
+                m.get('name') or m.get('model') for m in response.json().get('models', [])
+            } - {None}
         except Exception as e:
-            logger.error(f"Error verifying Ollama connection: {str(e)}")
-            return False 
\ No newline at end of file
+            # Older servers have no /api/ps; routing then ignores affinity
+            logger.debug(f"Could not read loaded models from {backend.url}: {str(e)}")
+        return True
+
+    def _pick_backend(self, model: str, exclude: set) -> Optional[OllamaBackend]:
+        """
+        Choose the server for a generation.
+
+        Prefers servers with a free slot (ollama_max_in_flight each), then
+        those that already have the model loaded, then the one with the
+        fewest outstanding requests. Ejected servers are only used when
+        nothing else is left.
+        """
+        candidates = [b for b in self.available_backends() if b.url not in exclude]
+        if not candidates:
+            candidates = [b for b in self.backends if b.url not in exclude]
+        if not candidates:
+            return None
+        max_in_flight = get_settings().ollama_max_in_flight
+        return min(candidates, key=lambda b: (
+            b.outstanding >= max_in_flight, model not in b.loaded_models, b.outstanding
+        ))
+
+    @asynccontextmanager
+    async def stream_chat(self, payload: Dict[str, Any]) -> AsyncIterator[httpx.Response]:
+        """
+        Stream an /api/chat generation over the shared connection pool.
+
+        Routed to one of the backends; if the connection fails, the request
+        is retried on the next best backend. Nothing has reached the caller
+        at that point, so the retry is invisible to it.
+        """
+        model = payload.get('model', self.default_model)
+        tried = set()
+        while True:
+            backend = self._pick_backend(model, tried)
+            if backend is None:
+                raise httpx.ConnectError(f"No Ollama server reachable (tried {', '.join(tried)})")
+            tried.add(backend.url)
+            backend.outstanding += 1
+            started = False
+            try:
+                async with self.client.stream(
+                    "POST",
+                    f"{backend.url}/api/chat",
+                    json=payload,
+                    headers={
+                        "Content-Type": "application/json",
+                        "Accept": "application/x-ndjson"
+                    },
+                    timeout=CHAT_STREAM_TIMEOUT
+                ) as response:
+                    self._record_health(backend, True)
+                    backend.loaded_models.add(model)
+                    started = True
+                    yield response
+                    return
+            except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+                if started:
+                    raise
+                self.mark_unhealthy(backend)
+                logger.warning(f"Could not reach Ollama server at {backend.url}, trying another: {str(e)}")
+            finally:
+                backend.outstanding -= 1
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Return the state of every backend."""
+        return [backend.stats() for backend in self.backends]
+
+
+class OllamaEmbedder:
+    """
+    Embeds text with Ollama's /api/embed endpoint.
+
+    A drop-in for SentenceTransformer.encode in RAGService: with several
+    worker processes, the embedding model is loaded once by Ollama instead
+    of once per worker. Synchronous, as it runs on the RAG worker pool.
+    """
+
+    def __init__(self, base_url: str, model: str, batch_size: int = 64):
+        self.base_url = base_url.rstrip('/')
+        self.model = model
+        self.batch_size = batch_size
+        self._client = httpx.Client(timeout=EMBED_TIMEOUT)
+
+    def encode(self, texts, batch_size: Optional[int] = None, **kwargs) -> np.ndarray:
+        """Embed a string (returns a vector) or a list of strings (returns a matrix)."""
+        single = isinstance(texts, str)
+        inputs = [texts] if single else list(texts)
+        batch_size = batch_size or self.batch_size
+        embeddings = []
+        for start in range(0, len(inputs), batch_size):
+            response = self._client.post(
+                f"{self.base_url}/api/embed",
+                json={"model": self.model, "input": inputs[start:start + batch_size]}
+            )
+            response.raise_for_status()
+            embeddings.extend(response.json()["embeddings"])
+        result = np.asarray(embeddings, dtype=np.float32)
+        return result[0] if single else result
+
+    def close(self) -> None:
+        self._client.close()
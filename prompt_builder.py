@@ -0,0 +1,242 @@
+import functools
+import logging
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+from models import Document
+from config import get_settings
+from lru_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# System instruction placed ahead of the retrieved chunks
+CONTEXT_INSTRUCTION = (
+    "Below is relevant context from the knowledge base. "
+    "Use this information to provide accurate and relevant responses to the user's questions. "
+    "The context is ordered by relevance, with relevance scores indicating the confidence level. "
+    "If the context doesn't contain sufficient information, rely on your general knowledge while "
+    "being transparent about what information comes from the context versus your general knowledge."
+)
+
+# Tokens a chat template adds around each message (role markers, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_WORD_OR_SYMBOLS = re.compile(r"\w+|[^\w\s]+")
+
+
+def format_document_header(doc: Document, index: int) -> str:
+    """Header line introducing one retrieved chunk in the context."""
+    title = doc.metadata.get('title', doc.metadata.get('filename', f'Document {index + 1}'))
+    score = doc.metadata.get('relevance_score', 0.0)
+    if doc.metadata.get('chunk_count', 1) > 1:
+        return (f"# {title}, part {doc.metadata['chunk_index'] + 1} of "
+                f"{doc.metadata['chunk_count']} (Relevance: {score:.2f})")
+    return f"# {title} (Relevance: {score:.2f})"
+
+
+def format_document(doc: Document, index: int) -> str:
+    """One retrieved chunk as it appears in the context, with header and separator."""
+    return f"{format_document_header(doc, index)}\n\n{doc.content}\n\n{'-' * 40}"
+
+
+class ApproximateTokenizer:
+    """
+    Estimates token counts without a vocabulary.
+
+    Counts one token per word or run of symbols, plus one per further five
+    characters of long words. Close to BPE tokenizers on English prose and
+    on the high side for code and identifiers, so budgets err towards fitting.
+    """
+
+    def count(self, text: str) -> int:
+        return sum(math.ceil(len(piece) / 5) for piece in _WORD_OR_SYMBOLS.findall(text))
+
+
+class HuggingFaceTokenizer:
+    """Exact token counts from a Hugging Face tokenizer (requires transformers)."""
+
+    def __init__(self, name: str):
+        from transformers import AutoTokenizer
+        self._tokenizer = AutoTokenizer.from_pretrained(name)
+
+    def count(self, text: str) -> int:
+        return len(self._tokenizer.encode(text, add_special_tokens=False))
+
+
+# Tokenizer factories by model name prefix, e.g. register_tokenizer("llama3", ...)
+_TOKENIZER_FACTORIES: Dict[str, Callable[[str], object]] = {}
+
+
+def register_tokenizer(model_prefix: str, factory: Callable[[str], object]) -> None:
+    """
+    Use factory(model) to build the tokenizer for models starting with model_prefix.
+
+    The tokenizer only needs a count(text) -> int method.
+    """
+    _TOKENIZER_FACTORIES[model_prefix] = factory
+    get_tokenizer.cache_clear()
+
+
+@functools.lru_cache(maxsize=32)
+def get_tokenizer(model: str):
+    """Return the tokenizer for a model, built once per model name."""
+    for prefix in sorted(_TOKENIZER_FACTORIES, key=len, reverse=True):
+        if model.startswith(prefix):
+            return _TOKENIZER_FACTORIES[prefix](model)
+
+    tokenizer_name = get_settings().tokenizer_name
+    if tokenizer_name:
+        try:
+            return HuggingFaceTokenizer(tokenizer_name)
+        except Exception as e:
+            logger.warning(f"Could not load tokenizer {tokenizer_name}, estimating token counts: {str(e)}")
+    return ApproximateTokenizer()
+
+
+def window_history(
+    messages: List[Dict[str, str]],
+    limit: int,
+    pin_system: bool = True,
+    pin_first_user: bool = False
+) -> List[Dict[str, str]]:
+    """
+    Keep the last limit messages plus pinned earlier ones, in order.
+
+    The in-memory counterpart of ChatService.get_history_window, for history
+    supplied with the request.
+    """
+    window_start = max(0, len(messages) - max(0, limit))
+    first_user = next((i for i, m in enumerate(messages) if m['role'] == 'user'), None)
+    return [
+        message for i, message in enumerate(messages)
+        if i >= window_start
+        or (pin_system and message['role'] == 'system')
+        or (pin_first_user and i == first_user)
+    ]
+
+
+@dataclass
+class Prompt:
+    messages: List[Dict[str, str]]
+    token_count: int
+    documents_used: int = 0
+    messages_dropped: int = 0
+    budget: int = 0
+    details: Dict[str, int] = field(default_factory=dict)
+
+
+class PromptBuilder:
+    """
+    Assembles the messages sent to Ollama within the model's context window.
+
+    The window, minus a reserve for the response, is shared between the
+    retrieved context and the chat history. The latest message is always
+    kept. Retrieved chunks get up to context_token_share of the budget, most
+    relevant first, and the history gets the rest, dropping the oldest turns
+    first. Budget the history leaves unused goes back to the chunks.
+    """
+
+    def __init__(self, cache_size: int = 4096):
+        # Token counts of message and chunk texts, which repeat every turn
+        self._counts = LRUCache(max_size=cache_size)
+
+    def count_tokens(self, model: str, text: str) -> int:
+        """Count the tokens in text for a model, caching the result."""
+        key = (model, text)
+        count = self._counts.get(key)
+        if count is None:
+            count = get_tokenizer(model).count(text)
+            self._counts.put(key, count)
+        return count
+
+    def _message_tokens(self, model: str, message: Dict[str, str]) -> int:
+        return self.count_tokens(model, message['content']) + MESSAGE_OVERHEAD_TOKENS
+
+    def build(
+        self,
+        model: str,
+        history: List[Dict[str, str]],
+        documents: Optional[List[Document]] = None,
+        context_window: Optional[int] = None,
+        instruction: str = CONTEXT_INSTRUCTION
+    ) -> Prompt:
+        """
+        Fit retrieved documents and chat history into the context window.
+
+        Args:
+            model: Ollama model name, used to pick the tokenizer
+            history: Chat messages ({"role", "content"}), oldest first
+            documents: Retrieved chunks, most relevant first
+            context_window: Model context size in tokens (default: settings.context_window)
+            instruction: System instruction placed before the chunks
+
+        Returns:
+            The messages to send and the tokens they use
+        """
+        settings = get_settings()
+        context_window = context_window or settings.context_window
+        budget = max(0, context_window - settings.response_token_reserve)
+        documents = documents or []
+
+        # The latest message is sent whatever it costs
+        latest = history[-1:] if history else []
+        earlier = history[:-1]
+        used = sum(self._message_tokens(model, m) for m in latest)
+        if used > budget:
+            logger.warning(f"Latest message alone uses {used} tokens of a {budget} token budget")
+
+        # Retrieved chunks, up to their share of the budget
+        instruction_tokens = self.count_tokens(model, instruction) + MESSAGE_OVERHEAD_TOKENS
+        chunk_texts = [format_document(doc, i) for i, doc in enumerate(documents)]
+        chunk_tokens = [self.count_tokens(model, text) + 2 for text in chunk_texts]
+        selected: List[int] = []
+        context_used = 0
+
+        def add_chunks(limit: int) -> None:
+            nonlocal context_used
+            for i, tokens in enumerate(chunk_tokens):
+                if i in selected:
+                    continue
+                cost = tokens + (instruction_tokens if not selected else 0)
+                if context_used + cost <= limit:
+                    selected.append(i)
+                    context_used += cost
+
+        add_chunks(min(budget - used, int(budget * settings.context_token_share)))
+
+        # History, newest first, in what is left
+        kept: List[Dict[str, str]] = []
+        history_used = 0
+        for message in reversed(earlier):
+            tokens = self._message_tokens(model, message)
+            if used + context_used + history_used + tokens > budget:
+                break
+            kept.append(message)
+            history_used += tokens
+        kept.reverse()
+
+        # Give budget the history did not need back to the chunks
+        add_chunks(budget - used - history_used)
+        selected.sort()
+
+        messages: List[Dict[str, str]] = []
+        if selected:
+            parts = "\n\n".join(chunk_texts[i] for i in selected)
+            messages.append({"role": "system", "content": f"{instruction}\n\n{parts}"})
+        messages.extend(kept)
+        messages.extend(latest)
+
+        prompt = Prompt(
+            messages=messages,
+            token_count=used + context_used + history_used,
+            documents_used=len(selected),
+            messages_dropped=len(earlier) - len(kept),
+            budget=budget,
+            details={"context": context_used, "history": history_used, "latest": used}
+        )
+        logger.debug("Prompt uses %d of %d tokens: %d context (%d/%d chunks), %d history "
+                     "(%d messages dropped), %d latest",
+                     prompt.token_count, budget, context_used, len(selected), len(documents),
+                     history_used, prompt.messages_dropped, used)
+        return prompt
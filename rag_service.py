@@ -1,57 +1,316 @@
-from typing import List, Optional, Dict, Any
-import chromadb
-from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
-from models import Document
+from typing import Callable, Iterable, Iterator, List, Optional, Dict, Any, Tuple
+import numpy as np
+from models import Document, DocumentSummary
 from config import get_settings
+from text_chunker import TextChunker
+from embedding_cache import EmbeddingCache
+from lru_cache import LRUCache
+from keyword_index import KeywordIndex
+from reranker import CrossEncoderReranker
+from prompt_builder import CONTEXT_INSTRUCTION, format_document_header
+from ollama_service import OllamaEmbedder
+import asyncio
+import functools
+import json
 import logging
 import uuid
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from urllib.parse import urlparse
 
 logger = logging.getLogger(__name__)
-settings = get_settings()
+
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+
+# Reciprocal rank fusion constant: damps the weight of the top few ranks
+# so agreement between the vector and keyword rankings counts for more
+RRF_K = 60
+
+# Keyword hits ranked within this many places of the top of both the vector
+# and keyword rankings are kept even below the semantic relevance threshold
+KEYWORD_BYPASS_RANK = 3
+
+class RAGNotReadyError(Exception):
+    """Raised when the collection or embedding model is needed before warm-up has loaded them."""
 
 class RAGService:
     def __init__(self):
-        # Ensure the persistence directory exists
-        persist_dir = Path(settings.chroma_persist_directory)
-        persist_dir.mkdir(parents=True, exist_ok=True)
+        settings = get_settings()
         
-        # Initialize ChromaDB with proper persistence settings
-        self.client = chromadb.PersistentClient(path=str(persist_dir))
+        # Chroma and the embedding model are loaded by warm_up(), not here, so
+        # the service can be created without importing torch or chromadb
+        self._client = None
+        self._collection = None
+        self._embedding_model = None
+        self._embedding_model_id = EMBEDDING_MODEL_NAME
+        self._keyword_index = None
+        self._ready = threading.Event()
+        self._warm_up_lock = threading.Lock()
+        self.warm_up_error: Optional[str] = None
         
-        # Get or create the collection
-        self.collection = self.client.get_or_create_collection(
-            name="documents",
-            metadata={"hnsw:space": "cosine"}  # Explicitly set distance metric
+        # Repeated chat queries skip transformer inference
+        self.embedding_cache = EmbeddingCache(
+            max_size=settings.embedding_cache_size,
+            path=settings.embedding_cache_path or None
         )
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
         
-        # Log the current state
-        count = self.collection.count()
-        logger.info(f"Initialized RAG service with {count} documents in collection")
-
-    def add_documents(self, documents: List[Document]) -> None:
-        """Add documents to the vector store."""
-        if not documents:
-            logger.warning("No documents provided to add_documents")
-            return
-
-        texts = [doc.content for doc in documents]
-        embeddings = self.embedding_model.encode(texts).tolist()
+        # Search results and relevant documents, keyed by the corpus generation
+        # so any add or delete makes earlier entries unreachable
+        self.retrieval_cache = LRUCache(max_size=settings.retrieval_cache_size)
         
-        # Generate unique IDs for each document if not provided
-        doc_ids = [doc.id if doc.id else str(uuid.uuid4()) for doc in documents]
+        # Optional second-stage ranking; the model loads only when enabled
+        self.reranker = CrossEncoderReranker(settings.rerank_model, settings.rerank_batch_size)
         
-        # Add documents to Chroma
-        self.collection.add(
-            embeddings=embeddings,
-            documents=texts,
-            ids=doc_ids,
-            metadatas=[doc.metadata for doc in documents]
+        # Dedicated pool for embedding and Chroma calls made from async code.
+        # Threads rather than processes: the model and client live in this
+        # process, and both torch and Chroma release the GIL while working.
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.rag_worker_threads,
+            thread_name_prefix="rag-worker"
         )
-        logger.info(f"Added {len(documents)} documents to the collection")
+
+    @property
+    def ready(self) -> bool:
+        """Whether Chroma and the embedding model are loaded."""
+        return self._ready.is_set()
+
+    def warm_up(self) -> None:
+        """
+        Import and load Chroma and the embedding model.
+
+        Called by the application's warm-up task; safe to call from several
+        threads, later callers waiting for the first to finish. Until it
+        succeeds, counting and listing report an empty store, retrieval
+        (get_relevant_context) returns no context and other methods that
+        need the collection or model raise RAGNotReadyError, so none of
+        them waits for the load or starts one of its own.
+        """
+        if self._ready.is_set():
+            return
+        with self._warm_up_lock:
+            if self._ready.is_set():
+                return
+            started = time.monotonic()
+            try:
+                import chromadb
+                
+                settings = get_settings()
+                # Ensure the persistence directory exists
+                persist_dir = Path(settings.chroma_persist_directory)
+                persist_dir.mkdir(parents=True, exist_ok=True)
+                
+                # Initialize ChromaDB with proper persistence settings
+                if settings.chroma_server_url:
+                    # Shared Chroma server, for several worker processes
+                    url = urlparse(settings.chroma_server_url)
+                    self._client = chromadb.HttpClient(
+                        host=url.hostname,
+                        port=url.port or (443 if url.scheme == 'https' else 8000),
+                        ssl=url.scheme == 'https'
+                    )
+                else:
+                    if settings.workers > 1:
+                        logger.warning("Embedded Chroma is not safe to share between worker processes; "
+                                       "set CHROMA_SERVER_URL when running with WORKERS > 1")
+                    self._client = chromadb.PersistentClient(path=str(persist_dir))
+                
+                # Get or create the collection
+                self._collection = self._client.get_or_create_collection(
+                    name="documents",
+                    metadata={"hnsw:space": "cosine"}  # Explicitly set distance metric
+                )
+                if settings.embedding_backend == "ollama":
+                    # One model in Ollama serves every worker process
+                    self._embedding_model = OllamaEmbedder(
+                        settings.ollama_server,
+                        settings.embedding_model,
+                        batch_size=settings.embedding_batch_size
+                    )
+                    self._embedding_model_id = f"ollama:{settings.embedding_model}"
+                else:
+                    from sentence_transformers import SentenceTransformer
+                    self._embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+                    self._embedding_model_id = EMBEDDING_MODEL_NAME
+                self._keyword_index = KeywordIndex(str(persist_dir / "keyword_index.db"))
+                if settings.rerank_enabled:
+                    try:
+                        self.reranker.load()
+                    except Exception as e:
+                        # Optional: search order is used without it
+                        logger.error(f"Could not load re-ranking model {self.reranker.model_name}, "
+                                     f"searching without re-ranking: {str(e)}")
+                self.embedding_cache.load()
+            except Exception as e:
+                self.warm_up_error = str(e)
+                logger.error(f"RAG service warm-up failed: {str(e)}")
+                raise
+            
+            self.warm_up_error = None
+            self._ready.set()
+            
+            self._migrate_unchunked()
+            if self._keyword_index.count() != self._collection.count():
+                self._rebuild_keyword_index()
+            
+            # Log the current state
+            count = self._collection.count()
+            logger.info(f"Initialized RAG service with {count} documents in collection "
+                        f"in {time.monotonic() - started:.1f}s")
+
+    @property
+    def generation(self) -> int:
+        """
+        Corpus generation; changes whenever documents are added or deleted.
+
+        Stored with the keyword index so that a change made by one worker
+        process invalidates the retrieval caches of all of them.
+        """
+        return self._keyword_index.generation() if self._keyword_index is not None else 0
+
+    def _bump_generation(self) -> None:
+        """Invalidate cached retrieval results after the corpus changed."""
+        if self.ready:
+            self._keyword_index.bump_generation()
+        self.retrieval_cache.clear()
+
+    def _require_ready(self) -> None:
+        """Raise RAGNotReadyError unless warm-up has finished."""
+        if not self.ready:
+            raise RAGNotReadyError(
+                f"RAG service failed to warm up: {self.warm_up_error}" if self.warm_up_error
+                else "RAG service is still warming up"
+            )
+
+    @property
+    def collection(self):
+        """The Chroma collection; raises RAGNotReadyError until warm-up has finished."""
+        self._require_ready()
+        return self._collection
+
+    @property
+    def keyword_index(self) -> KeywordIndex:
+        """The BM25 keyword index; raises RAGNotReadyError until warm-up has finished."""
+        self._require_ready()
+        return self._keyword_index
+
+    @property
+    def embedding_model(self):
+        """The embedding model (SentenceTransformer or OllamaEmbedder); raises RAGNotReadyError until warm-up has finished."""
+        self._require_ready()
+        return self._embedding_model
+
+    def add_documents(
+        self,
+        documents: Iterable[Document],
+        batch_size: Optional[int] = None,
+        progress_callback: Optional[Callable[[int, Optional[int], int], None]] = None
+    ) -> int:
+        """
+        Split documents into chunks and add them to the vector store.
+
+        Each chunk is stored under its own ID with metadata linking it back to
+        the parent document (parent_id, chunk_index, chunk_count) and to its
+        character offsets in the parent content (start_offset, end_offset).
+
+        Chunks are embedded and written to Chroma in fixed-size batches as they
+        are produced, so memory use is bounded by the batch size rather than the
+        size of the corpus. Embeddings stay float32 NumPy arrays end to end.
+
+        Args:
+            documents: Documents to add; may be a lazy iterable
+            batch_size: Chunks per embedding batch (default: settings.embedding_batch_size)
+            progress_callback: Called after every batch with
+                (documents_done, documents_total or None if unknown, chunks_added)
+
+        Returns:
+            Number of chunks added
+        """
+        batch_size = batch_size or get_settings().embedding_batch_size
+        documents_total = len(documents) if hasattr(documents, '__len__') else None
+        documents_done = 0
+        chunks_added = 0
+
+        batch: List[Tuple[str, str, Dict[str, Any]]] = []
+        for doc, doc_chunks in self._iter_chunks(documents):
+            for chunk in doc_chunks:
+                batch.append(chunk)
+                if len(batch) >= batch_size:
+                    chunks_added += self._add_batch(batch)
+                    batch = []
+                    if progress_callback:
+                        progress_callback(documents_done, documents_total, chunks_added)
+            documents_done += 1
+
+        if batch:
+            chunks_added += self._add_batch(batch)
+        if progress_callback:
+            progress_callback(documents_done, documents_total, chunks_added)
+
+        if documents_done == 0:
+            logger.warning("No documents provided to add_documents")
+        else:
+            logger.info(f"Added {documents_done} documents as {chunks_added} chunks to the collection")
+        return chunks_added
+
+    def _iter_chunks(
+        self, documents: Iterable[Document]
+    ) -> Iterator[Tuple[Document, List[Tuple[str, str, Dict[str, Any]]]]]:
+        """Yield each document with its (chunk_id, text, metadata) chunk tuples."""
+        settings = get_settings()
+        chunker = TextChunker(settings.chunk_size, settings.chunk_overlap)
+        for doc in documents:
+            # Generate a unique ID for the parent document if not provided
+            parent_id = doc.id if doc.id else str(uuid.uuid4())
+            chunks = chunker.split(doc.content)
+            if not chunks:
+                logger.warning(f"Document {parent_id} has no content to index")
+
+            yield doc, [
+                (
+                    f"{parent_id}_chunk_{index}",
+                    chunk.text,
+                    {
+                        **doc.metadata,
+                        "parent_id": parent_id,
+                        "chunk_index": index,
+                        "chunk_count": len(chunks),
+                        "start_offset": chunk.start,
+                        "end_offset": chunk.end
+                    }
+                )
+                for index, chunk in enumerate(chunks)
+            ]
+
+    def _add_batch(self, batch: List[Tuple[str, str, Dict[str, Any]]]) -> int:
+        """Embed one batch of chunks and write it to Chroma."""
+        chunk_ids = [chunk_id for chunk_id, _, _ in batch]
+        texts = [text for _, text, _ in batch]
+        metadatas = [metadata for _, _, metadata in batch]
+
+        embeddings = self.embedding_model.encode(
+            texts,
+            batch_size=len(texts),
+            convert_to_numpy=True
+        ).astype(np.float32, copy=False)
+
+        try:
+            self.collection.add(
+                embeddings=embeddings,
+                documents=texts,
+                ids=chunk_ids,
+                metadatas=metadatas
+            )
+            self.keyword_index.add(
+                (chunk_id, metadata["parent_id"], text)
+                for chunk_id, text, metadata in batch
+            )
+        finally:
+            self._bump_generation()
+        logger.debug(f"Added batch of {len(batch)} chunks to the collection")
+        return len(batch)
 
     def search(
         self, 
@@ -71,35 +330,62 @@ class RAGService:
             n_results: Number of results to return (default: 5)
             where: Filter by metadata fields
             where_document: Filter by document content
-            min_relevance_score: Minimum relevance score threshold (0.0 to 1.0)
+            min_relevance_score: Minimum relevance score threshold (0.0 to 1.0); keyword
+                hits with a BM25 score of at least settings.keyword_min_score, or
+                near the top of both rankings, are kept below it
             include_metadata: Whether to include metadata in results
-            hybrid_search: Whether to use hybrid search (combine semantic and keyword matching)
+            hybrid_search: Whether to fuse BM25 keyword matches with the vector results
+                (ignored when filters are given)
         
         Returns:
             List of relevant documents
         """
+        keyword_min_score = get_settings().keyword_min_score
+        cache_key = (
+            "search",
+            self.generation,
+            EmbeddingCache.normalize(query),
+            n_results,
+            json.dumps(where, sort_keys=True, default=str),
+            json.dumps(where_document, sort_keys=True, default=str),
+            min_relevance_score,
+            keyword_min_score,
+            include_metadata,
+            hybrid_search
+        )
+        cached = self.retrieval_cache.get(cache_key)
+        if cached is not None:
+            logger.debug("Serving %d search results for %r from cache", len(cached), query)
+            return [doc.model_copy(deep=True) for doc in cached]
+
+        if not self.ready:
+            logger.info("RAG service is not ready; returning no search results")
+            return []
+
         try:
-            logger.debug(f"Searching for documents with query: '{query}'")
-            logger.debug(f"Search parameters: n_results={n_results}, where={where}, "
-                      f"where_document={where_document}, min_score={min_relevance_score}, "
-                      f"hybrid={hybrid_search}")
+            logger.debug("Searching for documents with query: %r", query)
+            logger.debug("Search parameters: n_results=%s, where=%s, where_document=%s, "
+                         "min_score=%s, hybrid=%s",
+                         n_results, where, where_document, min_relevance_score, hybrid_search)
             
             # Check if there are any documents in the collection
             count = self.collection.count()
-            logger.debug(f"Collection contains {count} documents")
+            logger.debug("Collection contains %d documents", count)
             
             if count == 0:
                 logger.warning("No documents in collection to search")
                 return []
             
             # Generate query embedding
-            query_embedding = self.embedding_model.encode(query).tolist()
-            logger.debug(f"Generated query embedding with {len(query_embedding)} dimensions")
+            query_embedding = self._embed_query(query).tolist()
             
-            # Prepare search parameters
+            # Prepare search parameters. Only fetch what is used below: the
+            # stored vectors are never needed, and Chroma rejects a query
+            # that carries both embeddings and texts.
             search_params = {
                 "query_embeddings": [query_embedding],
                 "n_results": min(count, n_results * 2),  # Get more results initially for filtering
+                "include": ["metadatas", "documents", "distances"]
             }
             
             # Add filters if provided
@@ -108,54 +394,97 @@ class RAGService:
             if where_document:
                 search_params["where_document"] = where_document
             
-            # If hybrid search is enabled, include the text query
-            if hybrid_search:
-                search_params["query_texts"] = [query]
-                search_params["include"] = ["metadatas", "documents", "distances", "embeddings"]
-            
             # Perform the search
             results = self.collection.query(**search_params)
             
-            logger.debug(f"Raw search results: {results}")
+            vector_ids = results['ids'][0] if results and results['ids'] else []
+            logger.debug("Chroma returned %d candidates", len(vector_ids))
             
-            if not results or not results['documents'] or not results['documents'][0]:
+            # Hybrid search: BM25 over the same chunks. The keyword index
+            # cannot apply Chroma filters, so filtered searches stay vector-only.
+            keyword_scores: Dict[str, float] = {}
+            if hybrid_search and not where and not where_document:
+                keyword_scores = dict(self.keyword_index.search(query, limit=search_params["n_results"]))
+                logger.debug("Keyword index returned %d candidates", len(keyword_scores))
+            keyword_ids = list(keyword_scores)
+            
+            if not vector_ids and not keyword_ids:
                 logger.warning("No documents found in search results")
                 return []
             
+            # Collect content, metadata and semantic score for every candidate
+            candidates: Dict[str, Dict[str, Any]] = {}
+            for i, chunk_id in enumerate(vector_ids):
+                candidates[chunk_id] = {
+                    "content": results['documents'][0][i],
+                    "metadata": results['metadatas'][0][i] if results['metadatas'] else None,
+                    # Calculate normalized score (convert distance to similarity score)
+                    "score": 1.0 - (results['distances'][0][i] if results.get('distances') else 0.0)
+                }
+            keyword_only = [chunk_id for chunk_id in keyword_ids if chunk_id not in candidates]
+            if keyword_only:
+                # Only these few hits need their vectors, to score them on the same scale
+                extra = self.collection.get(ids=keyword_only, include=["documents", "metadatas", "embeddings"])
+                query_vector = np.asarray(query_embedding, dtype=np.float32)
+                for i, chunk_id in enumerate(extra['ids']):
+                    embedding = np.asarray(extra['embeddings'][i], dtype=np.float32)
+                    norms = np.linalg.norm(embedding) * np.linalg.norm(query_vector)
+                    candidates[chunk_id] = {
+                        "content": extra['documents'][i],
+                        "metadata": extra['metadatas'][i] if extra['metadatas'] else None,
+                        "score": float(embedding @ query_vector / norms) if norms else 0.0
+                    }
+            
+            # Reciprocal rank fusion of the two rankings
+            fused = {chunk_id: 0.0 for chunk_id in candidates}
+            for ranking in (vector_ids, keyword_ids):
+                for rank, chunk_id in enumerate(ranking):
+                    if chunk_id in fused:
+                        fused[chunk_id] += 1.0 / (RRF_K + rank + 1)
+            
+            # A keyword hit may stay below the semantic threshold only if it
+            # is a strong BM25 match or both rankings put it near the top; a
+            # single common word matching, as in small talk, is not enough
+            top_vector_hits = set(vector_ids[:KEYWORD_BYPASS_RANK])
+            keyword_hits = {
+                chunk_id for rank, chunk_id in enumerate(keyword_ids)
+                if keyword_scores[chunk_id] >= keyword_min_score
+                or (rank < KEYWORD_BYPASS_RANK and chunk_id in top_vector_hits)
+            }
+            
             # Process and filter results
             documents = []
-            for i in range(len(results['documents'][0])):
-                # Calculate normalized score (convert distance to similarity score)
-                score = 1.0 - (results['distances'][0][i] if 'distances' in results else 0.0)
+            for chunk_id in sorted(candidates, key=fused.get, reverse=True):
+                candidate = candidates[chunk_id]
+                score = candidate["score"]
                 
-                # Skip if below minimum relevance score
-                if score < min_relevance_score:
+                # Skip if below minimum relevance score, unless the chunk
+                # matched query terms strongly enough
+                if score < min_relevance_score and chunk_id not in keyword_hits:
                     continue
                 
                 # Create document with metadata if requested
-                metadata = results['metadatas'][0][i] if include_metadata and results['metadatas'] else {}
+                metadata = dict(candidate["metadata"] or {}) if include_metadata else {}
                 metadata['relevance_score'] = score
                 
                 doc = Document(
-                    id=results['ids'][0][i],
-                    content=results['documents'][0][i],
+                    id=chunk_id,
+                    content=candidate["content"],
                     metadata=metadata
                 )
                 documents.append(doc)
             
-            # Sort by relevance score
-            documents.sort(key=lambda x: x.metadata.get('relevance_score', 0.0), reverse=True)
-            
             # Trim to requested number of results
             documents = documents[:n_results]
             
-            logger.debug(f"Found {len(documents)} relevant documents")
-            for i, doc in enumerate(documents):
-                logger.debug(f"Document {i+1}: id={doc.id}, "
-                         f"filename={doc.metadata.get('filename', 'unknown')}, "
-                         f"score={doc.metadata.get('relevance_score', 0.0):.3f}, "
-                         f"size={len(doc.content)} chars")
+            logger.debug("Found %d relevant documents", len(documents))
+            if logger.isEnabledFor(logging.DEBUG):
+                for i, doc in enumerate(documents):
+                    logger.debug("Document %d: id=%s, filename=%s, score=%.3f, size=%d chars",
+                                 i + 1, doc.id, doc.metadata.get('filename', 'unknown'),
+                                 doc.metadata.get('relevance_score', 0.0), len(doc.content))
             
+            self.retrieval_cache.put(cache_key, [doc.model_copy(deep=True) for doc in documents])
             return documents
             
         except Exception as e:
@@ -164,65 +493,235 @@ class RAGService:
             logger.error(traceback.format_exc())
             return []
 
-    def list_documents(self) -> List[Document]:
-        """List all documents in the collection."""
+    def _embed_query(self, query: str) -> np.ndarray:
+        """Embed a search query, reusing the cached embedding for repeated queries."""
+        embedding = self.embedding_cache.get_embedding(self._embedding_model_id, query)
+        if embedding is None:
+            embedding = self.embedding_model.encode(
+                EmbeddingCache.normalize(query),
+                convert_to_numpy=True
+            ).astype(np.float32, copy=False)
+            self.embedding_cache.put_embedding(self._embedding_model_id, query, embedding)
+        return embedding
+
+    def list_documents(self, offset: int = 0, limit: Optional[int] = None) -> List[DocumentSummary]:
+        """
+        List documents by ID and metadata, without their content.
+
+        Reads only the metadata of each document's first chunk, so the cost
+        depends on the page size rather than the size of the corpus.
+        Empty until the service has warmed up.
+        """
+        if not self.ready:
+            return []
         try:
-            results = self.collection.get()
-            if not results or not results['documents']:
+            results = self.collection.get(
+                where={"chunk_index": 0},
+                include=["metadatas"],
+                offset=offset,
+                limit=limit
+            )
+            if not results or not results['ids']:
                 logger.info("No documents found in collection")
                 return []
             
-            documents = []
-            for i in range(len(results['documents'])):
-                doc = Document(
-                    id=results['ids'][i],
-                    content=results['documents'][i],
-                    metadata=results['metadatas'][i] if results['metadatas'] else {}
+            return [
+                DocumentSummary(
+                    id=metadata.get('parent_id', results['ids'][i]),
+                    metadata=self._parent_metadata(metadata)
                 )
-                documents.append(doc)
-            
-            return documents
+                for i, metadata in enumerate(results['metadatas'])
+            ]
         except Exception as e:
             logger.error(f"Error listing documents: {str(e)}")
             return []
 
+    def get_document(self, doc_id: str) -> Optional[Document]:
+        """Fetch one document's full content, reassembled from its chunks."""
+        results = self.collection.get(
+            where={"parent_id": doc_id},
+            include=["documents", "metadatas"]
+        )
+        if not results or not results['ids']:
+            return None
+        
+        chunks = sorted(
+            (
+                {"content": content, "metadata": metadata}
+                for content, metadata in zip(results['documents'], results['metadatas'])
+            ),
+            key=lambda c: c['metadata'].get('chunk_index', 0)
+        )
+        return Document(
+            id=doc_id,
+            content=self._stitch_chunks(chunks),
+            metadata=self._parent_metadata(chunks[0]['metadata'])
+        )
+
+    def count_documents(self) -> int:
+        """Count parent documents from the keyword index's counter, kept in step with the collection; 0 until warmed up."""
+        if not self.ready:
+            return 0
+        return self._keyword_index.document_count()
+
+    @staticmethod
+    def _parent_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """Strip chunk-specific keys from a chunk's metadata."""
+        return {
+            key: value for key, value in (metadata or {}).items()
+            if key not in ('parent_id', 'chunk_index', 'start_offset', 'end_offset')
+        }
+
+    def _migrate_unchunked(self) -> None:
+        """Give documents stored before chunking the chunk metadata listing relies on."""
+        chunked = self.collection.get(where={"chunk_index": {"$gte": 0}}, include=[])
+        if len(chunked['ids']) == self.collection.count():
+            return
+        
+        chunked_ids = set(chunked['ids'])
+        results = self.collection.get(include=["documents", "metadatas"])
+        ids = []
+        metadatas = []
+        for doc_id, content, metadata in zip(results['ids'], results['documents'], results['metadatas']):
+            if doc_id in chunked_ids:
+                continue
+            ids.append(doc_id)
+            metadatas.append({
+                **(metadata or {}),
+                "parent_id": doc_id,
+                "chunk_index": 0,
+                "chunk_count": 1,
+                "start_offset": 0,
+                "end_offset": len(content)
+            })
+        if ids:
+            self.collection.update(ids=ids, metadatas=metadatas)
+            self._bump_generation()
+            logger.info(f"Added chunk metadata to {len(ids)} documents stored before chunking")
+
+    def _rebuild_keyword_index(self, page_size: int = 500) -> None:
+        """Index every chunk in the collection, e.g. for a corpus ingested before the index existed."""
+        self._keyword_index.clear()
+        offset = 0
+        while True:
+            results = self._collection.get(include=["documents", "metadatas"], offset=offset, limit=page_size)
+            if not results['ids']:
+                break
+            self._keyword_index.add(
+                (chunk_id, (metadata or {}).get("parent_id", chunk_id), content or "")
+                for chunk_id, content, metadata in zip(results['ids'], results['documents'], results['metadatas'])
+            )
+            offset += len(results['ids'])
+        logger.info(f"Rebuilt keyword index with {offset} chunks")
+
+    @staticmethod
+    def _stitch_chunks(chunks: List[Dict[str, Any]]) -> str:
+        """Rebuild parent content from ordered chunks, dropping overlapping text."""
+        content = ""
+        end = 0
+        for chunk in chunks:
+            start = chunk['metadata'].get('start_offset')
+            if start is None:
+                # Legacy un-chunked document
+                content += chunk['content']
+                continue
+            if start > end:
+                content += " " * (start - end)
+            content += chunk['content'][max(0, end - start):]
+            end = max(end, chunk['metadata'].get('end_offset', start + len(chunk['content'])))
+        return content
+
     def delete_document(self, doc_id: str) -> bool:
-        """Delete a document from the collection."""
+        """Delete a document and all of its chunks from the collection."""
+        self._require_ready()
         try:
+            self.collection.delete(where={"parent_id": doc_id})
+            # Documents stored before chunking was introduced use the parent ID directly
             self.collection.delete(ids=[doc_id])
+            self.keyword_index.delete_parent(doc_id)
             logger.info(f"Deleted document with ID: {doc_id}")
             return True
         except Exception as e:
             logger.error(f"Error deleting document: {str(e)}")
             return False
+        finally:
+            self._bump_generation()
 
-    def get_relevant_context(self, query: str, max_length: int = 4000) -> str:
+    def get_relevant_documents(self, query: str) -> List[Document]:
         """
-        Get relevant context for a query with improved context building.
-        
-        Args:
-            query: The search query
-            max_length: Maximum length of the returned context
+        Get the chunks to use as context for a query, most relevant first.
         
-        Returns:
-            Formatted context string
+        Uses hybrid search and, when enabled, cross-encoder re-ranking.
+        Returns no documents while the service is still warming up.
         """
-        logger.debug(f"Getting relevant context for query: '{query}'")
+        logger.debug(f"Getting relevant documents for query: '{query}'")
         
         if not query:
-            logger.warning("Empty query provided to get_relevant_context")
-            return ""
+            logger.warning("Empty query provided to get_relevant_documents")
+            return []
+        
+        if not self.ready:
+            if self.warm_up_error:
+                logger.warning(f"RAG service failed to warm up, answering without context: {self.warm_up_error}")
+            else:
+                logger.info("RAG service is still warming up; answering without context")
+            return []
+
+        settings = get_settings()
+        # Without re-ranking if its model could not be loaded, rather than retrying per query
+        rerank = settings.rerank_enabled and self.reranker.load_error is None
+        cache_key = (
+            "documents",
+            self.generation,
+            EmbeddingCache.normalize(query),
+            settings.rerank_top_n if rerank else None
+        )
+        cached = self.retrieval_cache.get(cache_key)
+        if cached is not None:
+            logger.debug("Serving relevant documents from cache")
+            return [doc.model_copy(deep=True) for doc in cached]
 
         # Get relevant documents with hybrid search and scoring
+        # With re-ranking, over-fetch candidates and keep only the best few
         relevant_docs = self.search(
             query=query,
-            n_results=5,
+            n_results=settings.rerank_candidates if rerank else 5,
             min_relevance_score=0.3,
             hybrid_search=True
         )
         
+        if rerank and relevant_docs:
+            try:
+                relevant_docs = self.reranker.rerank(
+                    query, relevant_docs, settings.rerank_time_budget_ms
+                )[:settings.rerank_top_n]
+            except Exception as e:
+                logger.error(f"Re-ranking failed, using search order: {str(e)}")
+                relevant_docs = relevant_docs[:5]
+        
         if not relevant_docs:
             logger.info("No relevant documents found for context")
+            return []
+
+        self.retrieval_cache.put(cache_key, [doc.model_copy(deep=True) for doc in relevant_docs])
+        return relevant_docs
+
+    def get_relevant_context(self, query: str, max_length: int = 4000) -> str:
+        """
+        Get relevant context for a query as one string of at most about max_length characters.
+        
+        The chat endpoint budgets context in tokens with PromptBuilder instead;
+        this is for callers that want a ready-made context string.
+        
+        Args:
+            query: The search query
+            max_length: Maximum length of the returned context
+        
+        Returns:
+            Formatted context string
+        """
+        relevant_docs = self.get_relevant_documents(query)
+        if not relevant_docs:
             return ""
 
         # Build context with document boundaries and relevance scores
@@ -231,12 +730,8 @@ class RAGService:
         logger.debug(f"Building context from {len(relevant_docs)} documents")
         
         for i, doc in enumerate(relevant_docs):
-            # Extract title or filename from metadata
-            title = doc.metadata.get('title', doc.metadata.get('filename', f'Document {i+1}'))
-            score = doc.metadata.get('relevance_score', 0.0)
-            
             # Add document header with metadata
-            header = f"# {title} (Relevance: {score:.2f})"
+            header = format_document_header(doc, i)
             context_parts.append(header)
             
             # Add document content, truncated if needed
@@ -257,18 +752,66 @@ class RAGService:
             if total_length >= max_length:
                 break
         
-        # Add a system instruction to help the model use the context
-        system_instruction = (
-            "Below is relevant context from the knowledge base. "
-            "Use this information to provide accurate and relevant responses to the user's questions. "
-            "The context is ordered by relevance, with relevance scores indicating the confidence level. "
-            "If the context doesn't contain sufficient information, rely on your general knowledge while "
-            "being transparent about what information comes from the context versus your general knowledge."
-        )
-        
         # Join parts with newlines, avoiding backslash in f-string
         parts_joined = "\n\n".join(context_parts)
-        final_context = f"{system_instruction}\n\n{parts_joined}"
+        final_context = f"{CONTEXT_INSTRUCTION}\n\n{parts_joined}"
         logger.debug(f"Final context size: {len(final_context)} characters")
         
-        return final_context 
\ No newline at end of file
+        return final_context
+
+    async def _run_in_executor(self, func: Callable, *args, **kwargs):
+        """Run a blocking method on the RAG worker pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def awarm_up(self) -> None:
+        """Async variant of warm_up that runs on the RAG worker pool."""
+        await self._run_in_executor(self.warm_up)
+
+    async def aadd_documents(self, documents: Iterable[Document], **kwargs) -> int:
+        """Async variant of add_documents that runs on the RAG worker pool."""
+        return await self._run_in_executor(self.add_documents, documents, **kwargs)
+
+    async def asearch(self, query: str, **kwargs) -> List[Document]:
+        """Async variant of search that runs on the RAG worker pool."""
+        return await self._run_in_executor(self.search, query, **kwargs)
+
+    async def alist_documents(self, **kwargs) -> List[DocumentSummary]:
+        """Async variant of list_documents that runs on the RAG worker pool."""
+        return await self._run_in_executor(self.list_documents, **kwargs)
+
+    async def aget_document(self, doc_id: str) -> Optional[Document]:
+        """Async variant of get_document that runs on the RAG worker pool."""
+        return await self._run_in_executor(self.get_document, doc_id)
+
+    async def acount_documents(self) -> int:
+        """Async variant of count_documents that runs on the RAG worker pool."""
+        if not self.ready:
+            return 0
+        return await self._run_in_executor(self.count_documents)
+
+    async def adelete_document(self, doc_id: str) -> bool:
+        """Async variant of delete_document that runs on the RAG worker pool."""
+        return await self._run_in_executor(self.delete_document, doc_id)
+
+    async def aget_relevant_documents(self, query: str) -> List[Document]:
+        """Async variant of get_relevant_documents that runs on the RAG worker pool."""
+        if not self.ready:
+            # No context while warming up, without queueing behind the warm-up
+            return self.get_relevant_documents(query)
+        return await self._run_in_executor(self.get_relevant_documents, query)
+
+    async def aget_relevant_context(self, query: str, **kwargs) -> str:
+        """Async variant of get_relevant_context that runs on the RAG worker pool."""
+        return await self._run_in_executor(self.get_relevant_context, query, **kwargs)
+
+    def shutdown(self) -> None:
+        """Stop the RAG worker pool, waiting for in-flight work to finish."""
+        self._executor.shutdown(wait=True)
+        logger.info("RAG worker pool shut down")
+        if isinstance(self._embedding_model, OllamaEmbedder):
+            self._embedding_model.close()
+        try:
+            self.embedding_cache.save()
+        except Exception as e:
+            logger.error(f"Error saving embedding cache: {str(e)}")
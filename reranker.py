@@ -0,0 +1,95 @@
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from models import Document
+
+logger = logging.getLogger(__name__)
+
+class CrossEncoderReranker:
+    """
+    Re-orders search results with a cross-encoder, within a time budget.
+
+    A cross-encoder reads the query and a chunk together, which ranks far
+    better than comparing two independent embeddings but costs one model
+    pass per candidate, so candidates are scored in batches and scoring
+    stops once the budget is spent.
+    """
+
+    def __init__(self, model_name: str, batch_size: int = 8):
+        self.model_name = model_name
+        self.batch_size = max(1, batch_size)
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.load_error: Optional[str] = None
+        self.requests = 0
+        self.candidates_scored = 0
+        self.budget_exceeded = 0
+
+    def load(self) -> None:
+        """Import sentence-transformers and load the model, once; a failure is kept in load_error."""
+        if self._model is not None:
+            return
+        with self._load_lock:
+            if self._model is None:
+                started = time.monotonic()
+                try:
+                    from sentence_transformers import CrossEncoder
+                    self._model = CrossEncoder(self.model_name, device="cpu")
+                except Exception as e:
+                    self.load_error = str(e)
+                    raise
+                self.load_error = None
+                logger.info(f"Loaded re-ranking model {self.model_name} in {time.monotonic() - started:.1f}s")
+
+    def rerank(self, query: str, documents: List[Document], time_budget_ms: float) -> List[Document]:
+        """
+        Return documents ordered by cross-encoder score.
+
+        Candidates are scored best-first in batches of batch_size. At least
+        one batch is always scored; once time_budget_ms has elapsed the
+        remaining candidates keep their search order after the scored ones.
+        Scores are stored in each document's metadata as rerank_score.
+        """
+        if not documents:
+            return documents
+        self.load()
+
+        started = time.monotonic()
+        deadline = started + time_budget_ms / 1000
+        scored = 0
+        while scored < len(documents):
+            batch = documents[scored:scored + self.batch_size]
+            scores = self._model.predict(
+                [(query, doc.content) for doc in batch],
+                batch_size=len(batch),
+                show_progress_bar=False
+            )
+            for doc, score in zip(batch, scores):
+                doc.metadata['rerank_score'] = float(score)
+            scored += len(batch)
+            if time.monotonic() >= deadline:
+                break
+
+        with self._stats_lock:
+            self.requests += 1
+            self.candidates_scored += scored
+            if scored < len(documents):
+                self.budget_exceeded += 1
+
+        logger.debug("Re-ranked %d of %d candidates in %.1f ms",
+                     scored, len(documents), (time.monotonic() - started) * 1000)
+        ranked = sorted(documents[:scored], key=lambda doc: doc.metadata['rerank_score'], reverse=True)
+        return ranked + documents[scored:]
+
+    def stats(self) -> Dict[str, Any]:
+        """Return request and budget counters."""
+        with self._stats_lock:
+            return {
+                "loaded": self._model is not None,
+                "error": self.load_error,
+                "requests": self.requests,
+                "candidates_scored": self.candidates_scored,
+                "budget_exceeded": self.budget_exceeded
+            }
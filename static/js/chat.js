@@ -233,7 +233,8 @@ async function sendMessage() {
         if (!response.ok) {
             const errorData = await response.json();
             console.error('Server error:', errorData);
-            throw new Error(errorData.error?.message || errorData.detail?.message || 'Failed to send message');
+            throw new Error(errorData.error?.message || errorData.detail?.message ||
+                (typeof errorData.error === 'string' ? errorData.error : null) || 'Failed to send message');
         }
 
         console.log('Response received, starting to read stream');
@@ -268,7 +269,12 @@ async function sendMessage() {
                             throw new Error(data.error);
                         }
                         
+                        if (data.queue_position) {
+                            loading.title = `Waiting for the model (position ${data.queue_position} in queue)`;
+                        }
+                        
                         if (data.message) {
+                            loading.title = '';
                             assistantMessage += data.message;
                             updateStreamingMessage(assistantMessage);
                         }
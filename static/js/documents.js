@@ -107,7 +107,8 @@ async function loadDocuments() {
         if (!response.ok) throw new Error('Failed to load documents');
         const data = await response.json();
         
-        documentCount.textContent = `${data.documents.length} document${data.documents.length !== 1 ? 's' : ''}`;
+        const total = data.total ?? data.documents.length;
+        documentCount.textContent = `${total} document${total !== 1 ? 's' : ''}`;
         noDocuments.style.display = data.documents.length === 0 ? 'block' : 'none';
         documentList.innerHTML = '';
         
@@ -117,11 +118,6 @@ async function loadDocuments() {
             docDiv.style.transition = 'background-color var(--transition-fast) ease';
             docDiv.dataset.docId = doc.id;
             
-            // Truncate content for preview
-            const truncatedContent = doc.content.length > 500 
-                ? doc.content.substring(0, 500) + '...' 
-                : doc.content;
-            
             // Escape HTML to prevent XSS
             const escapeHtml = (unsafe) => {
                 return unsafe
@@ -132,8 +128,6 @@ async function loadDocuments() {
                     .replace(/'/g, "&#039;");
             };
             
-            const safeContent = escapeHtml(truncatedContent);
-            
             // Create the inner content div
             const contentDiv = document.createElement('div');
             contentDiv.className = 'd-flex justify-content-between align-items-start gap-4';
@@ -156,8 +150,8 @@ async function loadDocuments() {
                         <span>Show Content</span>
                     </button>
                     <div class="document-preview hidden mt-3 p-3 rounded" 
+                         data-doc-id="${escapeHtml(doc.id)}"
                          style="background-color: var(--surface-color-hover); font-family: var(--font-family-mono); font-size: var(--font-size-sm);">
-                        ${safeContent}
                     </div>
                 </div>
                 <div>
@@ -187,11 +181,29 @@ async function loadDocuments() {
     }
 }
 
-// Toggle content visibility
-function toggleContent(button) {
+// Toggle content visibility, fetching the document content on first open
+async function toggleContent(button) {
     const preview = button.nextElementSibling;
     const isHidden = preview.classList.contains('hidden');
     
+    if (isHidden && !preview.dataset.loaded) {
+        try {
+            const response = await fetch(`/api/documents/${encodeURIComponent(preview.dataset.docId)}`);
+            if (!response.ok) throw new Error('Failed to load document');
+            const doc = await response.json();
+            
+            // Truncate content for preview
+            preview.textContent = doc.content.length > 500
+                ? doc.content.substring(0, 500) + '...'
+                : doc.content;
+            preview.dataset.loaded = 'true';
+        } catch (e) {
+            console.error('Error loading document content:', e);
+            showToast(`Error loading document: ${e.message}`, 'error');
+            return;
+        }
+    }
+    
     preview.classList.toggle('hidden');
     button.innerHTML = isHidden
         ? '<i class="fas fa-chevron-up mr-1"></i> Hide Content'
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+class StatusService:
+    """
+    Serves the /system/status snapshot from memory.
+
+    The snapshot is refreshed in the background once it is older than
+    status_cache_ttl, so a poll never waits on Ollama, Chroma or disk after
+    the first one. Document and chat counts are read from the keyword index
+    and chat index, which all worker processes share, so every worker reports
+    the same numbers; endpoints that add or remove documents and chats
+    recount straight away.
+    """
+
+    def __init__(self, rag_service, chat_service, ollama_service):
+        self.rag_service = rag_service
+        self.chat_service = chat_service
+        self.ollama_service = ollama_service
+        self._document_count: Optional[int] = None
+        self._chat_count: Optional[int] = None
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._snapshot_at = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def refresh_chat_count(self) -> None:
+        """Recount chats after one was created or deleted and publish the count."""
+        self._count_chats()
+        self._publish_counts()
+
+    async def refresh_document_count(self) -> None:
+        """Recount documents after they changed and publish the count."""
+        await self._count_documents()
+        self._publish_counts()
+
+    async def _count_documents(self) -> None:
+        """Read the document count from the shared keyword index, keeping the last on failure; 0 while RAG warms up."""
+        try:
+            self._document_count = await self.rag_service.acount_documents()
+        except Exception as e:
+            logger.error(f"Error counting documents: {str(e)}")
+
+    def _count_chats(self) -> None:
+        """Read the chat count from the shared chat index, keeping the last on failure."""
+        try:
+            self._chat_count = self.chat_service.count_chats()
+        except Exception as e:
+            logger.error(f"Error counting chats: {str(e)}")
+
+    def _publish_counts(self) -> None:
+        """Copy the latest counts into the current snapshot."""
+        if self._snapshot is not None:
+            self._snapshot = {
+                **self._snapshot,
+                "document_count": self._document_count or 0,
+                "chat_count": self._chat_count or 0
+            }
+
+    async def get_status(self) -> Dict[str, Any]:
+        """Return the status snapshot, starting a background refresh if it is stale."""
+        if self._snapshot is None:
+            await self._refresh()
+        elif time.monotonic() - self._snapshot_at >= get_settings().status_cache_ttl:
+            if self._refresh_task is None or self._refresh_task.done():
+                self._refresh_task = asyncio.create_task(self._refresh())
+        return {**self._snapshot, "current_model": self.ollama_service.default_model}
+
+    async def _refresh(self) -> None:
+        """Rebuild the snapshot from the services."""
+        # Get available models
+        try:
+            models = await self.ollama_service.list_models()
+        except Exception as e:
+            logger.error(f"Error listing models: {str(e)}")
+            models = []
+
+        # Get document and chat counts
+        await self._count_documents()
+        self._count_chats()
+
+        # Check Ollama status from the cached health state
+        ollama_status = "running"
+        try:
+            if not await self.ollama_service.is_available():
+                ollama_status = "stopped"
+        except Exception as e:
+            logger.error(f"Ollama connection check failed: {str(e)}")
+            ollama_status = "error"
+
+        model_names = self._model_names(models)
+        # Ensure we have at least the default model
+        if not model_names:
+            model_names = [self.ollama_service.default_model]
+
+        self._snapshot = {
+            "status": "ok",
+            "ollama_status": ollama_status,
+            "models_available": model_names,
+            "current_model": self.ollama_service.default_model,
+            "document_count": self._document_count or 0,
+            "chat_count": self._chat_count or 0
+        }
+        self._snapshot_at = time.monotonic()
+
+    @staticmethod
+    def _model_names(models: Any) -> List[str]:
+        """Extract model names from the different list_models response formats."""
+        if isinstance(models, dict):
+            models = models.get('models', [])
+        if isinstance(models, str):
+            # Format: "model1,model2"
+            return [m.strip() for m in models.split(',') if m.strip()]
+        if isinstance(models, list):
+            # Formats: [{"name": "model1"}, ...] or ["model1", ...]
+            return [
+                m.get('name') if isinstance(m, dict) else str(m)
+                for m in models
+                if (m.get('name') if isinstance(m, dict) else m)
+            ]
+        return []
@@ -0,0 +1,79 @@
+import json
+import time
+from typing import Any, Callable, List, Optional
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+if ORJSON_AVAILABLE:
+    def loads(data: str) -> Any:
+        """Parse one JSON document; orjson errors subclass json.JSONDecodeError."""
+        return orjson.loads(data)
+
+    def dumps(obj: Any) -> bytes:
+        """Serialise obj as compact UTF-8 JSON."""
+        return orjson.dumps(obj)
+else:
+    def loads(data: str) -> Any:
+        """Parse one JSON document."""
+        return json.loads(data)
+
+    def dumps(obj: Any) -> bytes:
+        """Serialise obj as compact UTF-8 JSON."""
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def sse_event(obj: Any) -> bytes:
+    """One server-sent event carrying obj as JSON."""
+    return b"data: " + dumps(obj) + b"\n\n"
+
+
+def message_event(content: str) -> bytes:
+    """The event for a piece of the assistant's reply, without building a dict for it."""
+    return b'data: {"message":' + dumps(content) + b"}\n\n"
+
+
+class TokenCoalescer:
+    """
+    Batches streamed reply text into fewer, larger events.
+
+    Text is held back until flush_ms milliseconds have passed since the
+    first held piece or flush_chars characters are held, and is released with
+    the next piece that crosses either limit; call flush() at the end of
+    the stream. A limit of 0 is off; with both off every piece is released
+    at once.
+    """
+
+    def __init__(self, flush_ms: float = 0.0, flush_chars: int = 0, clock: Callable[[], float] = time.monotonic):
+        self.flush_seconds = flush_ms / 1000.0
+        self.flush_chars = flush_chars
+        self._clock = clock
+        self._parts: List[str] = []
+        self._size = 0
+        self._started = 0.0
+
+    def add(self, content: str) -> Optional[bytes]:
+        """Hold content, returning the event to send if a limit has been reached."""
+        if not self.flush_chars and not self.flush_seconds:
+            return message_event(content)
+        if not self._parts:
+            self._started = self._clock()
+        self._parts.append(content)
+        self._size += len(content)
+        if ((self.flush_chars and self._size >= self.flush_chars)
+                or (self.flush_seconds and self._clock() - self._started >= self.flush_seconds)):
+            return self.flush()
+        return None
+
+    def flush(self) -> Optional[bytes]:
+        """Return the event for all held text, or None if nothing is held."""
+        if not self._parts:
+            return None
+        content = self._parts[0] if len(self._parts) == 1 else "".join(self._parts)
+        self._parts.clear()
+        self._size = 0
+        return message_event(content)
@@ -0,0 +1,51 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from text_chunker import TextChunker  # noqa: E402
+
+PROSE = " ".join(f"This is sentence number {i} of the prose." for i in range(20))
+LOG = " ".join(f"ts={i} level=info msg=request_handled path=/api/v1/item/{i} status=200" for i in range(40))
+
+
+def assert_well_formed(text, chunks, chunker):
+    for chunk in chunks:
+        assert text[chunk.start:chunk.end] == chunk.text
+        assert len(chunk.text) <= chunker.chunk_size
+    for previous, chunk in zip(chunks, chunks[1:]):
+        # No chunk is contained in its predecessor
+        assert chunk.start > previous.start
+        assert chunk.end > previous.end
+
+
+def test_no_chunk_contained_in_its_predecessor():
+    text = PROSE + "\n\n" + LOG
+    chunker = TextChunker(1000, 200)
+    chunks = chunker.split(text)
+    assert_well_formed(text, chunks, chunker)
+
+
+def test_hard_split_pieces_overlap():
+    chunker = TextChunker(1000, 200)
+    chunks = chunker.split(LOG)
+    assert len(chunks) > 1
+    assert_well_formed(LOG, chunks, chunker)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert 0 < previous.end - chunk.start <= chunker.chunk_overlap
+
+
+def test_sentences_overlap():
+    chunker = TextChunker(200, 60)
+    chunks = chunker.split(PROSE)
+    assert_well_formed(PROSE, chunks, chunker)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert 0 < previous.end - chunk.start <= chunker.chunk_overlap
+
+
+def test_unbroken_text_longer_than_a_chunk():
+    text = "y" * 2500
+    chunker = TextChunker(1000, 200)
+    chunks = chunker.split(text)
+    assert_well_formed(text, chunks, chunker)
+    assert chunks[-1].end == len(text)
@@ -0,0 +1,107 @@
+import re
+from dataclasses import dataclass
+from typing import List, Tuple
+
+_PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+
+@dataclass
+class TextChunk:
+    text: str
+    start: int  # Offset of the first character in the parent text
+    end: int    # Offset one past the last character in the parent text
+
+
+class TextChunker:
+    """Split text into overlapping chunks along paragraph and sentence boundaries."""
+
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+        if chunk_overlap < 0 or chunk_overlap >= chunk_size:
+            raise ValueError("chunk_overlap must be between 0 and chunk_size")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+
+    def split(self, text: str) -> List[TextChunk]:
+        """
+        Split text into chunks of at most chunk_size characters.
+
+        Chunks are built from whole sentences where possible, never merge across
+        a paragraph break mid-sentence, and consecutive chunks share up to
+        chunk_overlap characters of trailing sentences, or of text when a
+        sentence had to be hard-split. Every chunk ends past the one before
+        it, so none is contained in its predecessor. Each chunk records its
+        offsets so text[start:end] == chunk.text.
+        """
+        segments = self._segments(text)
+        chunks = []
+        i = 0
+        while i < len(segments):
+            start = segments[i][0]
+            j = i + 1
+            while j < len(segments) and segments[j][1] - start <= self.chunk_size:
+                j += 1
+            end = segments[j - 1][1]
+            chunks.append(TextChunk(text=text[start:end], start=start, end=end))
+
+            if j >= len(segments):
+                break
+
+            # Step back over trailing segments that fit in the overlap window,
+            # as long as the next chunk still has room for the next segment
+            k = j
+            while (k - 1 > i and end - segments[k - 1][0] <= self.chunk_overlap
+                   and segments[j][1] - segments[k - 1][0] <= self.chunk_size):
+                k -= 1
+            i = k
+        return chunks
+
+    def _segments(self, text: str) -> List[Tuple[int, int]]:
+        """
+        Return (start, end) spans of sentences, none longer than chunk_size.
+
+        Pieces of a hard-split sentence overlap by up to chunk_overlap
+        characters, as the chunks built from whole sentences do.
+        """
+        segments = []
+        for para_start, para_end in self._spans(text, _PARAGRAPH_BREAK, 0, len(text)):
+            for start, end in self._spans(text, _SENTENCE_END, para_start, para_end):
+                # Hard-split sentences that are longer than a whole chunk
+                while end - start > self.chunk_size:
+                    cut = text.rfind(' ', start, start + self.chunk_size)
+                    if cut <= start:
+                        cut = start + self.chunk_size
+                    segments.append((start, cut))
+                    next_start = cut
+                    if cut - self.chunk_overlap > start:
+                        # Start the next piece at a word within the overlap window
+                        space = text.find(' ', cut - self.chunk_overlap, cut)
+                        next_start = space + 1 if space != -1 else cut - self.chunk_overlap
+                    start = next_start
+                    while start < end and text[start].isspace():
+                        start += 1
+                if start < end:
+                    segments.append((start, end))
+        return segments
+
+    @staticmethod
+    def _spans(text: str, separator: re.Pattern, start: int, end: int) -> List[Tuple[int, int]]:
+        """Split text[start:end] on separator, dropping whitespace-only spans."""
+        spans = []
+        pos = start
+        for match in separator.finditer(text, start, end):
+            spans.append((pos, match.start()))
+            pos = match.end()
+        spans.append((pos, end))
+
+        result = []
+        for span_start, span_end in spans:
+            while span_start < span_end and text[span_start].isspace():
+                span_start += 1
+            while span_end > span_start and text[span_end - 1].isspace():
+                span_end -= 1
+            if span_start < span_end:
+                result.append((span_start, span_end))
+        return result